@@ -1,11 +1,13 @@
 import streamlit as st
 import sqlite3
-from auth import authenticate_user, register_user, is_admin
-from database import init_database
+from auth import authenticate_user, register_user, get_identity
+from database import bootstrap_database
+from utils.backup import start_backup_scheduler
 import os
 
-# Initialize database
-init_database()
+# Initialize database (once per server process, not on every rerun)
+bootstrap_database()
+start_backup_scheduler()
 
 # Set page config
 st.set_page_config(
@@ -22,10 +24,47 @@ if "username" not in st.session_state:
     st.session_state.username = ""
 if "user_type" not in st.session_state:
     st.session_state.user_type = ""
+if "identity" not in st.session_state:
+    st.session_state.identity = None
+
+def start_session(identity):
+    """Store the identity resolved at login in session state"""
+    st.session_state.logged_in = True
+    st.session_state.identity = identity
+    st.session_state.username = identity['username']
+    st.session_state.user_type = identity['role']
+
+def end_session():
+    """Clear the logged-in user from session state"""
+    st.session_state.logged_in = False
+    st.session_state.identity = None
+    st.session_state.username = ""
+    st.session_state.user_type = ""
+    st.session_state.current_page = "Disease Detection"
+
+def refresh_session():
+    """Re-check the session identity against the identity cache
+    
+    Ends the session if the account was deleted or its password reset, and
+    picks up role changes. Costs nothing while the cached identity is fresh.
+    """
+    identity = st.session_state.identity
+    current = get_identity(identity['user_id']) if identity else None
+    
+    if current is None or current['credential_version'] != identity.get('credential_version'):
+        end_session()
+        return False
+    
+    if current != identity:
+        start_session(current)
+    return True
 
 def main():
     st.title("🏥 Skin Disease Detection System")
     
+    if st.session_state.logged_in and not refresh_session():
+        st.warning("Your session has ended. Please log in again.")
+    
     if not st.session_state.logged_in:
         show_login_page()
     else:
@@ -41,11 +80,9 @@ def show_login_page():
         
         if st.button("Login", key="login_btn"):
             if username and password:
-                user_data = authenticate_user(username, password)
-                if user_data:
-                    st.session_state.logged_in = True
-                    st.session_state.username = username
-                    st.session_state.user_type = "admin" if is_admin(username) else "user"
+                identity = authenticate_user(username, password)
+                if identity:
+                    start_session(identity)
                     st.success("Login successful!")
                     st.rerun()
                 else:
@@ -83,10 +120,7 @@ def show_main_app():
         st.write(f"Role: {st.session_state.user_type.title()}")
         
         if st.button("Logout"):
-            st.session_state.logged_in = False
-            st.session_state.username = ""
-            st.session_state.user_type = ""
-            st.session_state.current_page = "Disease Detection"
+            end_session()
             st.rerun()
         
         st.divider()
@@ -1,21 +1,86 @@
 import sqlite3
-import hashlib
+import threading
+import time
 from database import get_db_connection, hash_password
+from utils.cache import get_cached_version, invalidate_cache
+
+# How long a resolved identity is trusted before the users table is checked again.
+# Deletes and password resets bump the 'users' data version, which ends the
+# trust early, within utils.cache.VERSION_CHECK_INTERVAL even from another process.
+IDENTITY_TTL = 300
+
+# Process-wide: user_id -> (identity, expires_at, users data version)
+_identity_cache = {}
+_identity_lock = threading.Lock()
+
+def make_identity(user):
+    """Build the identity record kept in session state from a users row"""
+    return {
+        'user_id': user['id'],
+        'username': user['username'],
+        'role': "admin" if user['is_admin'] else "user",
+        # Bumped on every password change, so open sessions notice a reset
+        'credential_version': user['credential_version']
+    }
 
 def authenticate_user(username, password):
-    """Authenticate user login"""
+    """Authenticate user login, returning their identity record or None"""
+    # Read before the row, so a change made in between is seen on the next check
+    version = get_cached_version("users")
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
     password_hash = hash_password(password)
     cursor.execute('''
-        SELECT * FROM users WHERE username = ? AND password_hash = ?
+        SELECT id, username, is_admin, credential_version FROM users WHERE username = ? AND password_hash = ?
     ''', (username, password_hash))
     
     user = cursor.fetchone()
     conn.close()
     
-    return user
+    if not user:
+        return None
+    
+    identity = make_identity(user)
+    with _identity_lock:
+        _identity_cache[identity['user_id']] = (identity, time.monotonic() + IDENTITY_TTL, version)
+    
+    return identity
+
+def get_identity(user_id):
+    """Get a user's current identity, re-reading the users table once the cached one expires
+    
+    Returns None once the user no longer exists.
+    """
+    now = time.monotonic()
+    version = get_cached_version("users")
+    with _identity_lock:
+        cached = _identity_cache.get(user_id)
+    if cached and cached[1] > now and cached[2] == version:
+        return cached[0]
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, username, is_admin, credential_version FROM users WHERE id = ?', (user_id,))
+    user = cursor.fetchone()
+    conn.close()
+    
+    with _identity_lock:
+        if not user:
+            _identity_cache.pop(user_id, None)
+            return None
+        identity = make_identity(user)
+        _identity_cache[user_id] = (identity, now + IDENTITY_TTL, version)
+    
+    return identity
+
+def invalidate_identity(user_id):
+    """Drop a cached identity after the user is deleted or their account changes"""
+    with _identity_lock:
+        _identity_cache.pop(user_id, None)
+    # Re-read the 'users' version this process bumped along with the change
+    invalidate_cache("users")
 
 def register_user(username, email, password):
     """Register new user"""
@@ -35,25 +100,3 @@ def register_user(username, email, password):
     except sqlite3.IntegrityError:
         conn.close()
         return False
-
-def is_admin(username):
-    """Check if user is admin"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT is_admin FROM users WHERE username = ?', (username,))
-    result = cursor.fetchone()
-    conn.close()
-    
-    return result and result[0]
-
-def get_user_id(username):
-    """Get user ID by username"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT id FROM users WHERE username = ?', (username,))
-    result = cursor.fetchone()
-    conn.close()
-    
-    return result[0] if result else None
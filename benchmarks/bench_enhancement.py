@@ -0,0 +1,89 @@
+import os
+import sys
+import io
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_quality_gate import time_call
+from model_utils import MODEL_INPUT_SIZE
+from utils.image_processing import apply_image_enhancements, apply_fast_enhancements, opencv_threads, ENHANCE_WORKING_SIDE
+
+def make_lesion_image(width, height, seed=0):
+    """Create a JPEG-decoded skin-toned test image with a lesion and mottled texture
+    
+    Unlike pure noise, this has structure for the enhancement chain to act on.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([
+        180 + 40 * np.sin(x / 97.0),
+        120 + 30 * np.cos(y / 131.0),
+        100 + 20 * np.sin((x + y) / 173.0)
+    ], axis=2)
+    # Darker irregular lesion in the middle, mottled texture, mild sensor noise
+    radius = np.hypot((x - width / 2) / width, (y - height / 2) / height)
+    lesion = (radius < 0.15 + 0.03 * np.sin(np.arctan2(y - height / 2, x - width / 2) * 5))[..., None]
+    base = np.where(lesion, base * 0.45, base)
+    texture = rng.normal(0, 1, size=(height // 16 + 1, width // 16 + 1))
+    texture = np.kron(texture, np.ones((16, 16)))[:height, :width, None] * 6
+    noise = rng.normal(0, 3, size=base.shape)
+    img_array = np.clip(base + texture + noise, 0, 255).astype(np.uint8)
+    
+    # Round-trip through JPEG so the image looks like a real upload
+    buffer = io.BytesIO()
+    Image.fromarray(img_array).save(buffer, format='JPEG', quality=90)
+    buffer.seek(0)
+    return np.array(Image.open(buffer))
+
+def compute_ssim(img1, img2):
+    """Mean SSIM over the grayscale versions of two RGB images"""
+    a = cv2.cvtColor(img1, cv2.COLOR_RGB2GRAY).astype(np.float64)
+    b = cv2.cvtColor(img2, cv2.COLOR_RGB2GRAY).astype(np.float64)
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    
+    mu_a = cv2.GaussianBlur(a, (11, 11), 1.5)
+    mu_b = cv2.GaussianBlur(b, (11, 11), 1.5)
+    sigma_a = cv2.GaussianBlur(a * a, (11, 11), 1.5) - mu_a ** 2
+    sigma_b = cv2.GaussianBlur(b * b, (11, 11), 1.5) - mu_b ** 2
+    sigma_ab = cv2.GaussianBlur(a * b, (11, 11), 1.5) - mu_a * mu_b
+    
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * sigma_ab + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (sigma_a + sigma_b + c2))
+    return float(ssim_map.mean())
+
+def run_benchmark(sizes=((1024, 768), (2048, 1536), (4000, 3000)), repeats=5, threads=os.cpu_count()):
+    """Compare the full-resolution enhancement path with the fast path, single- and multi-threaded"""
+    print(f"OpenCV threads: {cv2.getNumThreads()} (xN runs use {threads}), OpenCL: {cv2.ocl.haveOpenCL() and cv2.ocl.useOpenCL()}, working side: {ENHANCE_WORKING_SIDE}px")
+    print(f"{'Image size':>12} | {'Full (ms)':>9} | {'Full xN (ms)':>12} | {'Fast (ms)':>9} | {'Fast xN (ms)':>12} | {'PSNR/SSIM @work':>16} | {'PSNR/SSIM @model':>16}")
+    print("-" * 106)
+    
+    for width, height in sizes:
+        img_array = make_lesion_image(width, height)
+        
+        full_ms = time_call(lambda: apply_image_enhancements(img_array), repeats)
+        fast_ms = time_call(lambda: apply_fast_enhancements(img_array), repeats)
+        with opencv_threads(threads):
+            full_threaded_ms = time_call(lambda: apply_image_enhancements(img_array), repeats)
+            fast_threaded_ms = time_call(lambda: apply_fast_enhancements(img_array), repeats)
+        
+        full_result = apply_image_enhancements(img_array)
+        fast_result = apply_fast_enhancements(img_array)
+        
+        # The fast path is judged against the full path seen at the same resolution
+        reference = cv2.resize(full_result, fast_result.shape[1::-1], interpolation=cv2.INTER_AREA)
+        work_psnr = cv2.PSNR(reference, fast_result)
+        work_ssim = compute_ssim(reference, fast_result)
+        
+        # ...and at the model input size, which is what the prediction sees
+        model_reference = cv2.resize(full_result, MODEL_INPUT_SIZE, interpolation=cv2.INTER_AREA)
+        model_fast = cv2.resize(fast_result, MODEL_INPUT_SIZE, interpolation=cv2.INTER_AREA)
+        model_psnr = cv2.PSNR(model_reference, model_fast)
+        model_ssim = compute_ssim(model_reference, model_fast)
+        
+        print(f"{width:>5}x{height:<6} | {full_ms:>9.1f} | {full_threaded_ms:>12.1f} | {fast_ms:>9.1f} | {fast_threaded_ms:>12.1f} | {work_psnr:>6.1f}dB/{work_ssim:.3f} | {model_psnr:>6.1f}dB/{model_ssim:.3f}")
+
+if __name__ == "__main__":
+    run_benchmark()
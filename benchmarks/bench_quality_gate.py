@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+import io
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_utils import load_model, preprocess_image, predict_disease
+from utils.image_processing import assess_image_quality, analyze_image_properties
+
+def make_test_image(width, height, seed=0):
+    """Create a JPEG-decoded test image with skin-like tones and some texture"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([
+        180 + 40 * np.sin(x / 97.0),
+        120 + 30 * np.cos(y / 131.0),
+        100 + 20 * np.sin((x + y) / 173.0)
+    ], axis=2)
+    noise = rng.normal(0, 12, size=base.shape)
+    img_array = np.clip(base + noise, 0, 255).astype(np.uint8)
+    
+    # Round-trip through JPEG so the image looks like a real upload
+    buffer = io.BytesIO()
+    Image.fromarray(img_array).save(buffer, format='JPEG', quality=90)
+    buffer.seek(0)
+    image = Image.open(buffer)
+    image.load()
+    return image
+
+def time_call(func, repeats):
+    """Return the median wall time of func() in milliseconds"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+def run_benchmark(sizes=((1024, 768), (2048, 1536), (4000, 3000)), repeats=7):
+    """Compare the quality gate against a full prediction and the full-resolution analysis"""
+    model = load_model()
+    
+    print(f"{'Image size':>12} | {'Gate (ms)':>10} | {'Full-res analysis (ms)':>22} | {'Prediction (ms)':>15} | {'Gate / prediction':>17}")
+    print("-" * 90)
+    
+    for width, height in sizes:
+        image = make_test_image(width, height)
+        
+        gate_ms = time_call(lambda: assess_image_quality(image), repeats)
+        full_ms = time_call(lambda: analyze_image_properties(image), repeats)
+        predict_ms = time_call(lambda: predict_disease(model, preprocess_image(image)), repeats)
+        
+        print(f"{width:>5}x{height:<6} | {gate_ms:>10.2f} | {full_ms:>22.2f} | {predict_ms:>15.2f} | {gate_ms / predict_ms:>16.1%}")
+
+if __name__ == "__main__":
+    run_benchmark()
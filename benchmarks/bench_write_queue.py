@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from utils.write_queue import submit_write, flush_writes, get_write_stats
+
+def insert_prediction(cursor, user_id, index):
+    """Insert one synthetic prediction row"""
+    cursor.execute('''
+        INSERT INTO predictions (user_id, image_name, predicted_disease, confidence_score)
+        VALUES (?, ?, ?, ?)
+    ''', (user_id, f"bench_{index}.jpg", "Eczema", 0.95))
+    return cursor.lastrowid
+
+def direct_insert(user_id, index):
+    """Insert and commit on the calling thread, as save_prediction used to"""
+    conn = database.get_db_connection()
+    insert_prediction(conn.cursor(), user_id, index)
+    conn.commit()
+    conn.close()
+
+def run_threads(target, threads, per_thread):
+    """Run target(thread_index, i) from several threads, returning inserts per second"""
+    def worker(thread_index):
+        for i in range(per_thread):
+            target(thread_index, i)
+    
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+    return threads * per_thread / (time.perf_counter() - start)
+
+def run_benchmark(threads=8, per_thread=250):
+    """Compare per-request commits with the write-behind queue on a scratch database"""
+    scratch_dir = tempfile.mkdtemp()
+    database.DATABASE_PATH = os.path.join(scratch_dir, "bench.sqlite")
+    database.bootstrap_database()
+    
+    try:
+        direct_rate = run_threads(lambda t, i: direct_insert(1, i), threads, per_thread)
+        
+        def queued(t, i):
+            submit_write(insert_prediction, 1, i)
+        queued_rate = run_threads(queued, threads, per_thread)
+        start = time.perf_counter()
+        flush_writes()
+        drain_ms = (time.perf_counter() - start) * 1000
+        
+        def queued_sync(t, i):
+            submit_write(insert_prediction, 1, i).result()
+        sync_rate = run_threads(queued_sync, threads, per_thread)
+        
+        stats = get_write_stats()
+        print(f"{threads} threads x {per_thread} inserts")
+        print(f"Direct commit per insert : {direct_rate:>9.0f} inserts/s")
+        print(f"Queued, fire-and-forget  : {queued_rate:>9.0f} inserts/s (drain after: {drain_ms:.1f} ms)")
+        print(f"Queued, wait for commit  : {sync_rate:>9.0f} inserts/s")
+        print(f"Writer batches: {stats['batches']}, writes: {stats['writes']}, failed: {stats['failed']}")
+    finally:
+        database.close_all_connections()
+        shutil.rmtree(scratch_dir)
+
+if __name__ == "__main__":
+    run_benchmark()
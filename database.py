@@ -1,104 +1,1003 @@
 import sqlite3
 import hashlib
 import os
+import queue
+import threading
+import atexit
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; migrations still serialize on BEGIN IMMEDIATE
+    fcntl = None
 
 DATABASE_PATH = "skin_disease_db.sqlite"
 
-def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE_PATH, timeout=30)
+# Connection settings
+CONNECTION_TIMEOUT = 30
+STATEMENT_CACHE_SIZE = 256
+CACHE_SIZE_KB = 16384
+MMAP_SIZE = 128 * 1024 * 1024
+HEALTH_CHECK_INTERVAL = 60
+
+# Admin reporting reads a read-only copy of the database, refreshed in the
+# background once it is older than this, so it never contends with writers
+ANALYTICS_SNAPSHOT_ENABLED = True
+ANALYTICS_REFRESH_INTERVAL = 300
+
+# Ids per IN (...) list in bulk deletes, well under SQLite's variable limit
+DELETE_CHUNK_SIZE = 500
+
+# Idle connections kept for reuse. Streamlit runs each rerun on a new script
+# thread, so connections are checked out per use rather than tied to a thread.
+POOL_MAX_IDLE = 8
+
+# Checked-in connections, most recently used first, for the live database and
+# the analytics snapshot
+_idle_connections = queue.LifoQueue(maxsize=POOL_MAX_IDLE)
+_snapshot_connections = queue.LifoQueue(maxsize=POOL_MAX_IDLE)
+_pool_generation = 0
+
+# Background snapshot refreshes are single-flight, and every refresh copies and
+# swaps the file under _snapshot_refresh_lock so an older copy never lands last
+_snapshot_lock = threading.Lock()
+_snapshot_refreshing = False
+_snapshot_refresh_pending = False
+_snapshot_refresh_lock = threading.Lock()
+
+# Process-wide start-up state for bootstrap_database
+_bootstrapped = False
+_bootstrap_lock = threading.Lock()
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection that goes back to the pool when callers close it"""
+    
+    # Set by checkout_connection for connections that belong to a pool
+    pool = None
+    pool_key = None
+    checked_out = False
+    checked_at = 0.0
+    
+    def close(self):
+        # Callers close after every query; drop uncommitted work and hand the connection back
+        if self.in_transaction:
+            self.rollback()
+        if self.checked_out:
+            self.checked_out = False
+            release_connection(self)
+    
+    def close_connection(self):
+        """Really close the underlying connection"""
+        super().close()
+
+def open_connection(path=None):
+    """Open a new tuned connection to the database"""
+    conn = sqlite3.connect(
+        path or DATABASE_PATH,
+        timeout=CONNECTION_TIMEOUT,
+        factory=PooledConnection,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False
+    )
     conn.row_factory = sqlite3.Row
+    
+    # Only takes effect on a new database; existing ones are converted by utils.archive
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    
+    # WAL lets readers run alongside the writer; NORMAL sync is durable in WAL mode
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # Deleting a user or doctor cascades to their dependent rows
+    conn.execute("PRAGMA foreign_keys=ON")
     return conn
 
-def init_database():
-    """Initialize database with required tables"""
+def check_connection_health(conn):
+    """Check that a pooled connection still answers queries"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        conn.execute("SELECT 1").fetchone()
+        return True
+    except sqlite3.Error:
+        return False
+
+def discard_connection(conn):
+    """Close a connection that will not be reused"""
+    try:
+        conn.close_connection()
+    except sqlite3.Error:
+        pass
+
+def checkout_connection(pool, key, connect):
+    """Take an idle connection opened for key from pool, or open one with connect()
+    
+    key identifies what the connection was opened on; idle connections with
+    another key are closed. Callers hand the connection back with conn.close().
+    """
+    while True:
+        try:
+            conn = pool.get_nowait()
+        except queue.Empty:
+            conn = connect()
+            conn.pool = pool
+            conn.pool_key = key
+            break
         
-        # Users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                is_admin BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+        if conn.pool_key != key:
+            discard_connection(conn)
+        elif time.monotonic() - conn.checked_at > HEALTH_CHECK_INTERVAL and not check_connection_health(conn):
+            discard_connection(conn)
+        else:
+            break
+    
+    # A previous caller may have raised before committing
+    if conn.in_transaction:
+        conn.rollback()
+    
+    conn.checked_out = True
+    return conn
+
+def get_db_connection():
+    """Check out a database connection from the pool, opening a new one if none is idle
+    
+    Callers hand it back with conn.close().
+    """
+    return checkout_connection(_idle_connections, (DATABASE_PATH, _pool_generation), open_connection)
+
+def release_connection(conn):
+    """Put a closed-by-caller connection back in its idle pool, or close it if the pool is full"""
+    # Pools are emptied at shutdown; connections checked out then are not kept
+    if conn.pool_key[-1] != _pool_generation:
+        discard_connection(conn)
+        return
+    
+    conn.checked_at = time.monotonic()
+    try:
+        conn.pool.put_nowait(conn)
+    except queue.Full:
+        discard_connection(conn)
+
+def close_all_connections():
+    """Close every idle pooled connection (used at interpreter shutdown)"""
+    global _pool_generation
+    
+    # Connections checked out right now belong to an old generation and are
+    # closed by release_connection when they come back
+    _pool_generation += 1
+    for pool in (_idle_connections, _snapshot_connections):
+        while True:
+            try:
+                discard_connection(pool.get_nowait())
+            except queue.Empty:
+                break
+
+atexit.register(close_all_connections)
+
+def get_snapshot_path():
+    """Get the analytics snapshot file for the current database"""
+    base, extension = os.path.splitext(DATABASE_PATH)
+    return f"{base}.analytics{extension or '.sqlite'}"
+
+def refresh_analytics_snapshot():
+    """Copy the live database into the analytics snapshot with the online backup API
+    
+    The copy runs in one step under a single WAL read transaction, so writers
+    are never blocked, and is swapped in with an atomic rename. Refreshes run
+    one at a time: a refresh requested while another is copying waits for it
+    and then copies again, so it always sees the caller's own writes.
+    """
+    snapshot_path = get_snapshot_path()
+    temp_path = f"{snapshot_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    
+    with _snapshot_refresh_lock:
+        source = open_connection()
+        target = sqlite3.connect(temp_path)
+        try:
+            source.backup(target)
+            # Readers open the snapshot immutable, which needs a rollback-journal file
+            target.execute("PRAGMA journal_mode=DELETE")
+            target.close()
+            os.replace(temp_path, snapshot_path)
+        except Exception:
+            target.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        finally:
+            source.close_connection()
+
+def refresh_snapshot_in_background():
+    """Start a snapshot refresh on a worker thread
+    
+    If one is already running, it copies once more when it finishes, so
+    writes committed before this call always reach the snapshot.
+    """
+    global _snapshot_refreshing, _snapshot_refresh_pending
+    
+    with _snapshot_lock:
+        if _snapshot_refreshing:
+            _snapshot_refresh_pending = True
+            return
+        _snapshot_refreshing = True
+    
+    def run_refresh():
+        global _snapshot_refreshing, _snapshot_refresh_pending
+        while True:
+            try:
+                refresh_analytics_snapshot()
+            except Exception as e:
+                print(f"Analytics snapshot refresh failed: {e}")
+            
+            with _snapshot_lock:
+                if not _snapshot_refresh_pending:
+                    _snapshot_refreshing = False
+                    return
+                _snapshot_refresh_pending = False
+    
+    threading.Thread(target=run_refresh, name="analytics-snapshot", daemon=True).start()
+
+def is_snapshot_refreshing():
+    """Check whether a background snapshot refresh is running"""
+    with _snapshot_lock:
+        return _snapshot_refreshing
+
+def get_snapshot_age():
+    """Get the age of the analytics snapshot in seconds, or None if there is none"""
+    try:
+        return time.time() - os.path.getmtime(get_snapshot_path())
+    except OSError:
+        return None
+
+def open_snapshot_connection(snapshot_path):
+    """Open a read-only connection to an analytics snapshot file"""
+    conn = sqlite3.connect(
+        f"file:{snapshot_path}?mode=ro&immutable=1",
+        uri=True,
+        factory=PooledConnection,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    return conn
+
+def get_analytics_connection():
+    """Check out a read-only connection for admin reporting queries
+    
+    Reads the analytics snapshot when it is enabled, refreshing it in the
+    background once stale; otherwise returns a live connection. Callers hand
+    it back with conn.close().
+    """
+    if not ANALYTICS_SNAPSHOT_ENABLED:
+        return get_db_connection()
+    
+    age = get_snapshot_age()
+    if age is None:
+        # First use: there is nothing to show until one copy exists
+        refresh_analytics_snapshot()
+    elif age > ANALYTICS_REFRESH_INTERVAL:
+        refresh_snapshot_in_background()
+    
+    # Idle connections to a file a refresh has since replaced are closed on checkout
+    snapshot_path = get_snapshot_path()
+    stat = os.stat(snapshot_path)
+    key = (snapshot_path, stat.st_ino, stat.st_mtime_ns, _pool_generation)
+    return checkout_connection(_snapshot_connections, key, lambda: open_snapshot_connection(snapshot_path))
+
+def migrate_create_tables(cursor):
+    """Create the base tables"""
+    # Users table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            is_admin BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Doctors table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS doctors (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            specialization TEXT NOT NULL,
+            contact_email TEXT,
+            contact_phone TEXT,
+            address TEXT,
+            experience_years INTEGER,
+            diseases_treated TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Predictions table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            image_name TEXT,
+            predicted_disease TEXT,
+            confidence_score REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
+    # Feedback table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS feedback (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            prediction_id INTEGER,
+            rating INTEGER,
+            comments TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (prediction_id) REFERENCES predictions (id)
+        )
+    ''')
+
+def create_query_indexes(cursor):
+    """Create the indexes behind the history, feedback and admin queries"""
+    # Per-user history, newest first (the rowid makes it cover keyset paging too)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_predictions_user_created ON predictions (user_id, created_at)")
+    # Disease breakdowns and recent activity
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_predictions_disease ON predictions (predicted_disease)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_predictions_created ON predictions (created_at)")
+    # Feedback joins carry the rating so rating filters stay in the index
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_feedback_prediction ON feedback (prediction_id, rating)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_feedback_user ON feedback (user_id, created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_feedback_created ON feedback (created_at)")
+    # User list filters on is_admin and sorts by join date
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_admin_created ON users (is_admin, created_at)")
+
+def migrate_add_query_indexes(cursor):
+    """Index the columns the history, feedback and admin pages filter and sort on"""
+    # created_at is stored as canonical 'YYYY-MM-DD HH:MM:SS' UTC text, which sorts
+    # chronologically, so normalize any other spellings before indexing it
+    for table in ('users', 'predictions', 'feedback'):
+        cursor.execute(f'''
+            UPDATE {table}
+            SET created_at = strftime('%Y-%m-%d %H:%M:%S', created_at)
+            WHERE created_at IS NOT NULL
+              AND strftime('%Y-%m-%d %H:%M:%S', created_at) IS NOT NULL
+              AND created_at != strftime('%Y-%m-%d %H:%M:%S', created_at)
         ''')
-        
-        # Doctors table
+    
+    create_query_indexes(cursor)
+
+def migrate_seed_defaults(cursor):
+    """Create the default admin account and sample doctors"""
+    # Create default admin user if not exists
+    cursor.execute("SELECT * FROM users WHERE username = 'admin'")
+    if not cursor.fetchone():
+        admin_password = hashlib.sha256("admin123".encode()).hexdigest()
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS doctors (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                specialization TEXT NOT NULL,
-                contact_email TEXT,
-                contact_phone TEXT,
-                address TEXT,
-                experience_years INTEGER,
-                diseases_treated TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+            INSERT INTO users (username, email, password_hash, is_admin)
+            VALUES (?, ?, ?, ?)
+        ''', ("admin", "admin@skindisease.com", admin_password, True))
+    
+    # Add some sample doctors if table is empty
+    cursor.execute("SELECT COUNT(*) FROM doctors")
+    if cursor.fetchone()[0] == 0:
+        sample_doctors = [
+            ("Dr. Sarah Johnson", "Dermatology & Oncology", "sarah.johnson@hospital.com", "555-0123", "123 Medical Center Dr", 15, "Melanoma, Squamous Cell Carcinoma, Actinic Keratosis"),
+            ("Dr. Michael Chen", "Dermatopathology", "michael.chen@clinic.com", "555-0124", "456 Health Plaza", 12, "Melanoma, Seborrheic Keratosis, Dermatofibroma"),
+            ("Dr. Emily Davis", "Dermatology", "emily.davis@skincare.com", "555-0125", "789 Beauty Ave", 8, "Actinic Keratosis, Seborrheic Keratosis, Dermatofibroma"),
+            ("Dr. Robert Wilson", "Oncology & Dermatology", "robert.wilson@childcare.com", "555-0126", "321 Kids Health St", 10, "Squamous Cell Carcinoma, Melanoma, Actinic Keratosis"),
+            ("Dr. Lisa Martinez", "Mohs Surgery", "lisa.martinez@mohscenter.com", "555-0127", "555 Surgical Suite", 18, "Squamous Cell Carcinoma, Melanoma, Actinic Keratosis"),
+            ("Dr. David Park", "Dermatology", "david.park@dermclinic.com", "555-0128", "888 Skin Care Ave", 7, "Dermatofibroma, Seborrheic Keratosis, Actinic Keratosis")
+        ]
         
-        # Predictions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS predictions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                image_name TEXT,
-                predicted_disease TEXT,
-                confidence_score REAL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
+        for doctor in sample_doctors:
+            cursor.execute('''
+                INSERT INTO doctors (name, specialization, contact_email, contact_phone, address, experience_years, diseases_treated)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', doctor)
+
+def create_archive_tables(cursor):
+    """Create the tables that keep archived rows in the lifetime totals
+    
+    utils.archive sets the 'archive' guard while it moves rows out, so the
+    delete triggers leave the counters alone, and records what it moved in
+    the archived_* tallies so a rebuild still counts it.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS trigger_guards (
+            name TEXT PRIMARY KEY
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archived_prediction_counts (
+            user_id INTEGER NOT NULL,
+            predicted_disease TEXT NOT NULL,
+            prediction_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, predicted_disease)
+        ) WITHOUT ROWID
+    ''')
+    # Same buckets as feedback_daily_rollup; rating 0 holds unrated feedback
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archived_feedback_rollup (
+            day TEXT NOT NULL,
+            predicted_disease TEXT NOT NULL,
+            rating INTEGER NOT NULL,
+            feedback_count INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, predicted_disease, rating)
+        ) WITHOUT ROWID
+    ''')
+
+def create_summary_triggers(cursor):
+    """Create the triggers that keep summary counters and per-user activity current"""
+    create_archive_tables(cursor)
+    
+    # Executed one by one: executescript would commit the migration transaction
+    triggers = [
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_users_insert_counters AFTER INSERT ON users
+            WHEN NEW.is_admin = 0
+            BEGIN
+                UPDATE summary_counters SET value = value + 1 WHERE name = 'users';
+            END;
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_users_delete_counters AFTER DELETE ON users
+            WHEN OLD.is_admin = 0
+            BEGIN
+                UPDATE summary_counters SET value = value - 1 WHERE name = 'users';
+                UPDATE summary_counters SET value = value - 1 WHERE name = 'active_users' AND OLD.prediction_count > 0;
+            END;
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_users_role_counters AFTER UPDATE OF is_admin ON users
+            WHEN OLD.is_admin != NEW.is_admin
+            BEGIN
+                UPDATE summary_counters SET value = value + (CASE WHEN NEW.is_admin = 0 THEN 1 ELSE -1 END)
+                WHERE name = 'users' OR (name = 'active_users' AND NEW.prediction_count > 0);
+            END;
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_doctors_insert_counters AFTER INSERT ON doctors
+            BEGIN
+                UPDATE summary_counters SET value = value + 1 WHERE name = 'doctors';
+            END;
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_doctors_delete_counters AFTER DELETE ON doctors
+            BEGIN
+                UPDATE summary_counters SET value = value - 1 WHERE name = 'doctors';
+            END;
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_predictions_insert_counters AFTER INSERT ON predictions
+            BEGIN
+                UPDATE summary_counters SET value = value + 1 WHERE name = 'predictions';
+                UPDATE summary_counters SET value = value + 1 WHERE name = 'active_users'
+                    AND EXISTS (SELECT 1 FROM users WHERE id = NEW.user_id AND is_admin = 0 AND prediction_count = 0);
+                INSERT INTO disease_prediction_counts (predicted_disease, prediction_count)
+                    VALUES (NEW.predicted_disease, 1)
+                    ON CONFLICT (predicted_disease) DO UPDATE SET prediction_count = prediction_count + 1;
+                UPDATE users SET
+                    prediction_count = prediction_count + 1,
+                    last_prediction_at = CASE
+                        WHEN last_prediction_at IS NULL OR NEW.created_at > last_prediction_at THEN NEW.created_at
+                        ELSE last_prediction_at
+                    END
+                WHERE id = NEW.user_id;
+            END;
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_predictions_delete_counters AFTER DELETE ON predictions
+            WHEN NOT EXISTS (SELECT 1 FROM trigger_guards WHERE name = 'archive')
+            BEGIN
+                UPDATE summary_counters SET value = value - 1 WHERE name = 'predictions';
+                UPDATE disease_prediction_counts SET prediction_count = prediction_count - 1
+                    WHERE predicted_disease = OLD.predicted_disease;
+                UPDATE users SET
+                    prediction_count = prediction_count - 1,
+                    last_prediction_at = (SELECT MAX(created_at) FROM predictions WHERE user_id = OLD.user_id)
+                WHERE id = OLD.user_id;
+                UPDATE summary_counters SET value = value - 1 WHERE name = 'active_users'
+                    AND EXISTS (SELECT 1 FROM users WHERE id = OLD.user_id AND is_admin = 0 AND prediction_count = 0);
+            END;
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_predictions_disease_counters AFTER UPDATE OF predicted_disease ON predictions
+            WHEN OLD.predicted_disease IS NOT NEW.predicted_disease
+            BEGIN
+                UPDATE disease_prediction_counts SET prediction_count = prediction_count - 1
+                    WHERE predicted_disease = OLD.predicted_disease;
+                INSERT INTO disease_prediction_counts (predicted_disease, prediction_count)
+                    VALUES (NEW.predicted_disease, 1)
+                    ON CONFLICT (predicted_disease) DO UPDATE SET prediction_count = prediction_count + 1;
+            END;
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_feedback_insert_counters AFTER INSERT ON feedback
+            BEGIN
+                UPDATE summary_counters SET value = value + 1 WHERE name = 'feedback';
+            END;
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_feedback_delete_counters AFTER DELETE ON feedback
+            WHEN NOT EXISTS (SELECT 1 FROM trigger_guards WHERE name = 'archive')
+            BEGIN
+                UPDATE summary_counters SET value = value - 1 WHERE name = 'feedback';
+            END;
+        '''
+    ]
+    
+    for trigger in triggers:
+        cursor.execute(trigger)
+
+def rebuild_summary_counters(cursor):
+    """Recompute every summary counter from the base tables and archived tallies (fixes drift)"""
+    cursor.execute("DELETE FROM summary_counters")
+    cursor.execute('''
+        INSERT INTO summary_counters (name, value)
+        SELECT 'users', COUNT(*) FROM users WHERE is_admin = 0
+        UNION ALL SELECT 'doctors', COUNT(*) FROM doctors
+        UNION ALL SELECT 'predictions',
+            (SELECT COUNT(*) FROM predictions)
+            + (SELECT COALESCE(SUM(prediction_count), 0) FROM archived_prediction_counts)
+        UNION ALL SELECT 'feedback',
+            (SELECT COUNT(*) FROM feedback)
+            + (SELECT COALESCE(SUM(feedback_count), 0) FROM archived_feedback_rollup)
+        UNION ALL SELECT 'active_users', COUNT(DISTINCT p.user_id)
+            FROM (
+                SELECT user_id FROM predictions
+                UNION SELECT user_id FROM archived_prediction_counts
+            ) p JOIN users u ON p.user_id = u.id WHERE u.is_admin = 0
+    ''')
+    
+    cursor.execute("DELETE FROM disease_prediction_counts")
+    cursor.execute('''
+        INSERT INTO disease_prediction_counts (predicted_disease, prediction_count)
+        SELECT predicted_disease, SUM(prediction_count) FROM (
+            SELECT predicted_disease, COUNT(*) AS prediction_count FROM predictions
+            WHERE predicted_disease IS NOT NULL
+            GROUP BY predicted_disease
+            UNION ALL
+            SELECT predicted_disease, prediction_count FROM archived_prediction_counts
+            WHERE predicted_disease != ''
+        )
+        GROUP BY predicted_disease
+    ''')
+    
+    # Archiving moves the oldest rows, so a user's newest prediction is still hot when they have any
+    cursor.execute('''
+        UPDATE users SET
+            prediction_count = (SELECT COUNT(*) FROM predictions WHERE user_id = users.id)
+                + (SELECT COALESCE(SUM(prediction_count), 0) FROM archived_prediction_counts WHERE user_id = users.id),
+            last_prediction_at = COALESCE(
+                (SELECT MAX(created_at) FROM predictions WHERE user_id = users.id),
+                last_prediction_at
             )
-        ''')
-        
-        # Feedback table
+    ''')
+
+def migrate_add_summary_counters(cursor):
+    """Add trigger-maintained totals and per-user prediction activity"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS summary_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS disease_prediction_counts (
+            predicted_disease TEXT PRIMARY KEY,
+            prediction_count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("ALTER TABLE users ADD COLUMN prediction_count INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("ALTER TABLE users ADD COLUMN last_prediction_at TIMESTAMP")
+    
+    create_summary_triggers(cursor)
+    rebuild_summary_counters(cursor)
+
+def record_feedback_rollup(cursor, prediction_id, rating):
+    """Add one new feedback row to today's rollup bucket"""
+    cursor.execute('''
+        INSERT INTO feedback_daily_rollup (day, predicted_disease, rating, feedback_count, rating_sum)
+        VALUES (date('now'), COALESCE((SELECT predicted_disease FROM predictions WHERE id = ?), ''), ?, 1, ?)
+        ON CONFLICT (day, predicted_disease, rating) DO UPDATE SET
+            feedback_count = feedback_count + 1,
+            rating_sum = rating_sum + excluded.rating_sum
+    ''', (prediction_id, rating, rating))
+
+def retract_feedback_rollup(cursor, condition, params=()):
+    """Remove feedback matching condition (on feedback f) from the rollup before it is deleted"""
+    cursor.execute(f'''
+        UPDATE feedback_daily_rollup SET
+            feedback_count = feedback_daily_rollup.feedback_count - removed.feedback_count,
+            rating_sum = feedback_daily_rollup.rating_sum - removed.rating_sum
+        FROM (
+            SELECT date(f.created_at) AS day,
+                   COALESCE(p.predicted_disease, '') AS predicted_disease,
+                   f.rating,
+                   COUNT(*) AS feedback_count,
+                   SUM(f.rating) AS rating_sum
+            FROM feedback f
+            LEFT JOIN predictions p ON f.prediction_id = p.id
+            WHERE f.rating IS NOT NULL AND ({condition})
+            GROUP BY 1, 2, 3
+        ) AS removed
+        WHERE feedback_daily_rollup.day = removed.day
+          AND feedback_daily_rollup.predicted_disease = removed.predicted_disease
+          AND feedback_daily_rollup.rating = removed.rating
+    ''', tuple(params))
+
+def rebuild_feedback_rollup(cursor, since_day=None):
+    """Recompute the rollup from the feedback table, optionally only from since_day on"""
+    day_filter = "AND date(f.created_at) >= ?" if since_day else ""
+    params = (since_day,) if since_day else ()
+    
+    cursor.execute(f"DELETE FROM feedback_daily_rollup {'WHERE day >= ?' if since_day else ''}", params)
+    cursor.execute(f'''
+        INSERT INTO feedback_daily_rollup (day, predicted_disease, rating, feedback_count, rating_sum)
+        SELECT day, predicted_disease, rating, SUM(feedback_count), SUM(rating_sum) FROM (
+            SELECT date(f.created_at) AS day,
+                   COALESCE(p.predicted_disease, '') AS predicted_disease,
+                   f.rating AS rating,
+                   COUNT(*) AS feedback_count,
+                   SUM(f.rating) AS rating_sum
+            FROM feedback f
+            LEFT JOIN predictions p ON f.prediction_id = p.id
+            WHERE f.rating IS NOT NULL {day_filter}
+            GROUP BY 1, 2, 3
+            UNION ALL
+            SELECT day, predicted_disease, rating, feedback_count, rating_sum
+            FROM archived_feedback_rollup
+            WHERE rating != 0 {'AND day >= ?' if since_day else ''}
+        )
+        GROUP BY 1, 2, 3
+    ''', params * 2)
+
+def migrate_add_feedback_rollup(cursor):
+    """Add the daily feedback rollup used by the analytics charts"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS feedback_daily_rollup (
+            day TEXT NOT NULL,
+            predicted_disease TEXT NOT NULL,
+            rating INTEGER NOT NULL,
+            feedback_count INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, predicted_disease, rating)
+        ) WITHOUT ROWID
+    ''')
+    
+    rebuild_feedback_rollup(cursor)
+
+def bump_data_version(cursor, name):
+    """Advance the version of a reference dataset so cached copies are dropped"""
+    cursor.execute('''
+        INSERT INTO data_versions (name, version) VALUES (?, 1)
+        ON CONFLICT (name) DO UPDATE SET version = version + 1
+    ''', (name,))
+
+def migrate_add_data_versions(cursor):
+    """Add the version counters that key the reference data cache"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('doctors', 1)")
+
+# Key in doctor_diseases for the general dermatology fallback list
+GENERAL_DERMATOLOGY_KEY = ""
+
+def match_disease_classes(diseases_treated):
+    """Map a doctor's free-text condition list onto canonical DISEASE_CLASSES names
+    
+    A class matches when its full name appears in the text, or when a listed
+    condition equals its short name or abbreviation ("Basal Cell Carcinoma", "BCC").
+    """
+    from model_utils import DISEASE_CLASSES
+    
+    text = (diseases_treated or "").lower()
+    terms = {term.strip() for term in text.split(",") if term.strip()}
+    matched = []
+    
+    for disease in DISEASE_CLASSES:
+        short_name, _, abbreviation = disease.lower().partition(" (")
+        abbreviation = abbreviation.rstrip(")")
+        if disease.lower() in text or short_name in terms or (abbreviation and abbreviation in terms):
+            matched.append(disease)
+    
+    return matched
+
+def get_doctor_disease_keys(specialization, diseases_treated):
+    """Get every doctor_diseases key a doctor should be listed under"""
+    keys = match_disease_classes(diseases_treated)
+    if "dermatology" in (specialization or "").lower():
+        keys.append(GENERAL_DERMATOLOGY_KEY)
+    return keys
+
+def rank_doctor_diseases(cursor, diseases):
+    """Recompute the precomputed recommendation order for the given disease keys"""
+    for disease in diseases:
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS feedback (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                prediction_id INTEGER,
-                rating INTEGER,
-                comments TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                FOREIGN KEY (prediction_id) REFERENCES predictions (id)
-            )
-        ''')
-        
-        # Create default admin user if not exists
-        cursor.execute("SELECT * FROM users WHERE username = 'admin'")
-        if not cursor.fetchone():
-            admin_password = hashlib.sha256("admin123".encode()).hexdigest()
-            cursor.execute('''
-                INSERT INTO users (username, email, password_hash, is_admin)
-                VALUES (?, ?, ?, ?)
-            ''', ("admin", "admin@skindisease.com", admin_password, True))
-        
-        # Add some sample doctors if table is empty
-        cursor.execute("SELECT COUNT(*) FROM doctors")
-        if cursor.fetchone()[0] == 0:
-            sample_doctors = [
-                ("Dr. Sarah Johnson", "Dermatology & Oncology", "sarah.johnson@hospital.com", "555-0123", "123 Medical Center Dr", 15, "Melanoma, Squamous Cell Carcinoma, Actinic Keratosis"),
-                ("Dr. Michael Chen", "Dermatopathology", "michael.chen@clinic.com", "555-0124", "456 Health Plaza", 12, "Melanoma, Seborrheic Keratosis, Dermatofibroma"),
-                ("Dr. Emily Davis", "Dermatology", "emily.davis@skincare.com", "555-0125", "789 Beauty Ave", 8, "Actinic Keratosis, Seborrheic Keratosis, Dermatofibroma"),
-                ("Dr. Robert Wilson", "Oncology & Dermatology", "robert.wilson@childcare.com", "555-0126", "321 Kids Health St", 10, "Squamous Cell Carcinoma, Melanoma, Actinic Keratosis"),
-                ("Dr. Lisa Martinez", "Mohs Surgery", "lisa.martinez@mohscenter.com", "555-0127", "555 Surgical Suite", 18, "Squamous Cell Carcinoma, Melanoma, Actinic Keratosis"),
-                ("Dr. David Park", "Dermatology", "david.park@dermclinic.com", "555-0128", "888 Skin Care Ave", 7, "Dermatofibroma, Seborrheic Keratosis, Actinic Keratosis")
-            ]
+            UPDATE doctor_diseases SET rank = ranked.rank
+            FROM (
+                SELECT dd.doctor_id,
+                       ROW_NUMBER() OVER (ORDER BY d.experience_years DESC, d.id) AS rank
+                FROM doctor_diseases dd
+                JOIN doctors d ON dd.doctor_id = d.id
+                WHERE dd.disease = ?
+            ) AS ranked
+            WHERE doctor_diseases.disease = ? AND doctor_diseases.doctor_id = ranked.doctor_id
+        ''', (disease, disease))
+
+def sync_doctor_diseases(cursor, doctor_id, specialization, diseases_treated):
+    """Rewrite one doctor's rows in doctor_diseases and re-rank the affected diseases"""
+    cursor.execute("SELECT disease FROM doctor_diseases WHERE doctor_id = ?", (doctor_id,))
+    affected = {row[0] for row in cursor.fetchall()}
+    cursor.execute("DELETE FROM doctor_diseases WHERE doctor_id = ?", (doctor_id,))
+    
+    diseases = get_doctor_disease_keys(specialization, diseases_treated)
+    cursor.executemany(
+        "INSERT INTO doctor_diseases (disease, doctor_id, rank) VALUES (?, ?, 0)",
+        [(disease, doctor_id) for disease in diseases]
+    )
+    
+    rank_doctor_diseases(cursor, affected | set(diseases))
+
+def index_doctor_diseases(cursor, doctors):
+    """Add doctor_diseases rows for new (id, specialization, diseases_treated) doctors, ranking once"""
+    mappings = []
+    for doctor_id, specialization, diseases_treated in doctors:
+        mappings.extend((disease, doctor_id) for disease in get_doctor_disease_keys(specialization, diseases_treated))
+    
+    cursor.executemany("INSERT OR IGNORE INTO doctor_diseases (disease, doctor_id, rank) VALUES (?, ?, 0)", mappings)
+    rank_doctor_diseases(cursor, {disease for disease, _ in mappings})
+
+def migrate_add_doctor_diseases(cursor):
+    """Add the disease-to-doctor mapping used for recommendations"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS doctor_diseases (
+            disease TEXT NOT NULL,
+            doctor_id INTEGER NOT NULL,
+            rank INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (disease, doctor_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_doctor_diseases_rank ON doctor_diseases (disease, rank)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_doctor_diseases_doctor ON doctor_diseases (doctor_id)")
+    
+    cursor.execute("SELECT id, specialization, diseases_treated FROM doctors")
+    index_doctor_diseases(cursor, cursor.fetchall())
+
+def rebuild_table(cursor, table, create_sql):
+    """Recreate a table from a new definition, keeping its rows and AUTOINCREMENT position
+    
+    create_sql takes the new table name as {table}. Indexes and triggers go
+    with the old table, so the caller recreates them.
+    """
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,))
+    sequence = cursor.fetchone()
+    
+    cursor.execute(f"PRAGMA table_info({table})")
+    columns = ", ".join(row[1] for row in cursor.fetchall())
+    
+    cursor.execute(create_sql.format(table=f"{table}_rebuild"))
+    cursor.execute(f"INSERT INTO {table}_rebuild ({columns}) SELECT {columns} FROM {table}")
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(f"ALTER TABLE {table}_rebuild RENAME TO {table}")
+    
+    if sequence:
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, sequence[0]))
+
+def migrate_add_cascading_deletes(cursor):
+    """Rebuild the child tables with ON DELETE CASCADE foreign keys"""
+    # Rows left behind by earlier partial deletes would fail the foreign key check
+    orphaned_feedback = '''
+        f.user_id NOT IN (SELECT id FROM users)
+        OR f.prediction_id NOT IN (SELECT id FROM predictions)
+        OR (p.user_id IS NOT NULL AND p.user_id NOT IN (SELECT id FROM users))
+    '''
+    retract_feedback_rollup(cursor, orphaned_feedback)
+    cursor.execute('''
+        DELETE FROM feedback WHERE id IN (
+            SELECT f.id FROM feedback f LEFT JOIN predictions p ON f.prediction_id = p.id
+            WHERE ''' + orphaned_feedback + '''
+        )
+    ''')
+    cursor.execute("DELETE FROM predictions WHERE user_id IS NOT NULL AND user_id NOT IN (SELECT id FROM users)")
+    cursor.execute("DELETE FROM doctor_diseases WHERE doctor_id NOT IN (SELECT id FROM doctors)")
+    
+    rebuild_table(cursor, "predictions", '''
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            image_name TEXT,
+            predicted_disease TEXT,
+            confidence_score REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    rebuild_table(cursor, "feedback", '''
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            prediction_id INTEGER,
+            rating INTEGER,
+            comments TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+            FOREIGN KEY (prediction_id) REFERENCES predictions (id) ON DELETE CASCADE
+        )
+    ''')
+    rebuild_table(cursor, "doctor_diseases", '''
+        CREATE TABLE {table} (
+            disease TEXT NOT NULL,
+            doctor_id INTEGER NOT NULL,
+            rank INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (disease, doctor_id),
+            FOREIGN KEY (doctor_id) REFERENCES doctors (id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    ''')
+    
+    create_query_indexes(cursor)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_doctor_diseases_rank ON doctor_diseases (disease, rank)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_doctor_diseases_doctor ON doctor_diseases (doctor_id)")
+    create_summary_triggers(cursor)
+    
+    cursor.execute("PRAGMA foreign_key_check")
+    violations = cursor.fetchall()
+    if violations:
+        raise sqlite3.IntegrityError(f"Foreign key violations after rebuild: {[tuple(row) for row in violations[:5]]}")
+
+def migrate_add_prediction_images(cursor):
+    """Reference each prediction's image in the content-addressed image store"""
+    cursor.execute("PRAGMA table_info(predictions)")
+    if "image_sha256" not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE predictions ADD COLUMN image_sha256 TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_predictions_image ON predictions (image_sha256)")
+
+def migrate_add_prediction_hashes(cursor):
+    """Add perceptual hashes and repeat-upload links to predictions"""
+    cursor.execute("PRAGMA table_info(predictions)")
+    columns = [row[1] for row in cursor.fetchall()]
+    if "image_phash" not in columns:
+        cursor.execute("ALTER TABLE predictions ADD COLUMN image_phash INTEGER")
+    if "duplicate_of" not in columns:
+        # Points at the first prediction of the same picture by the same user
+        cursor.execute("ALTER TABLE predictions ADD COLUMN duplicate_of INTEGER REFERENCES predictions (id) ON DELETE SET NULL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_predictions_duplicate ON predictions (duplicate_of)")
+
+def create_duplicate_triggers(cursor):
+    """Create the trigger that keeps repeat-upload clusters together when their first upload goes"""
+    # The oldest surviving repeat becomes the new first upload and the rest point at it
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_predictions_reroot_duplicates AFTER DELETE ON predictions
+        WHEN OLD.duplicate_of IS NULL
+        BEGIN
+            UPDATE predictions
+            SET duplicate_of = NULLIF((SELECT MIN(id) FROM predictions WHERE duplicate_of = OLD.id), id)
+            WHERE duplicate_of = OLD.id;
+        END;
+    ''')
+
+def migrate_reroot_duplicates(cursor):
+    """Re-point repeat uploads at the oldest survivor instead of orphaning them when their first upload is deleted or archived"""
+    # ON DELETE SET NULL would clear the links before the trigger could follow them
+    rebuild_table(cursor, "predictions", '''
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            image_name TEXT,
+            predicted_disease TEXT,
+            confidence_score REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            image_sha256 TEXT,
+            image_phash INTEGER,
+            duplicate_of INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+            FOREIGN KEY (duplicate_of) REFERENCES predictions (id)
+        )
+    ''')
+    
+    create_query_indexes(cursor)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_predictions_image ON predictions (image_sha256)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_predictions_duplicate ON predictions (duplicate_of)")
+    create_summary_triggers(cursor)
+    create_duplicate_triggers(cursor)
+    
+    # Clusters already orphaned by earlier deletes cannot be recovered here;
+    # manage.py backfill-image-hashes links them again
+    cursor.execute("PRAGMA foreign_key_check(predictions)")
+    violations = cursor.fetchall()
+    if violations:
+        raise sqlite3.IntegrityError(f"Foreign key violations after rebuild: {[tuple(row) for row in violations[:5]]}")
+
+def migrate_keep_archived_totals(cursor):
+    """Keep archived predictions and feedback in the lifetime counters and rollup"""
+    # Recreated with the archive guard by create_summary_triggers
+    cursor.execute("DROP TRIGGER IF EXISTS trg_predictions_delete_counters")
+    cursor.execute("DROP TRIGGER IF EXISTS trg_feedback_delete_counters")
+    create_summary_triggers(cursor)
+
+def migrate_add_credential_versions(cursor):
+    """Count password changes per user so open sessions can tell they are stale"""
+    cursor.execute("PRAGMA table_info(users)")
+    if "credential_version" not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE users ADD COLUMN credential_version INTEGER NOT NULL DEFAULT 0")
+
+# Ordered schema migrations; the applied version is kept in PRAGMA user_version
+MIGRATIONS = [
+    (1, "create base tables", migrate_create_tables),
+    (2, "add query indexes", migrate_add_query_indexes),
+    (3, "seed default admin and sample doctors", migrate_seed_defaults),
+    (4, "add summary counters", migrate_add_summary_counters),
+    (5, "add daily feedback rollup", migrate_add_feedback_rollup),
+    (6, "add reference data versions", migrate_add_data_versions),
+    (7, "add doctor disease mapping", migrate_add_doctor_diseases),
+    (8, "add cascading foreign keys", migrate_add_cascading_deletes),
+    (9, "add prediction image references", migrate_add_prediction_images),
+    (10, "add prediction image hashes", migrate_add_prediction_hashes),
+    (11, "add user credential versions", migrate_add_credential_versions),
+    (12, "keep archived rows in lifetime totals", migrate_keep_archived_totals),
+    (13, "re-root repeat uploads when their first upload goes", migrate_reroot_duplicates),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    """Get the schema version recorded in the database"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def apply_migrations(conn):
+    """Apply pending migrations in order, each in its own transaction"""
+    applied = []
+    
+    # Table rebuilds drop and recreate tables; with enforcement on, the drop
+    # would cascade. The pragma only takes effect outside a transaction.
+    conn.execute("PRAGMA foreign_keys=OFF")
+    try:
+        for version, description, migrate in MIGRATIONS:
+            if version <= get_schema_version(conn):
+                continue
             
-            for doctor in sample_doctors:
-                cursor.execute('''
-                    INSERT INTO doctors (name, specialization, contact_email, contact_phone, address, experience_years, diseases_treated)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', doctor)
-        
-        conn.commit()
+            # Take the write lock first, then re-check in case another process got here
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if version <= get_schema_version(conn):
+                    conn.rollback()
+                    continue
+                
+                migrate(conn.cursor())
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            
+            applied.append(version)
+            print(f"Applied schema migration {version}: {description}")
+    finally:
+        conn.execute("PRAGMA foreign_keys=ON")
+    
+    if applied:
+        conn.execute("PRAGMA optimize")
+    
+    return applied
+
+def init_database():
+    """Initialize database with required tables, returning whether it succeeded"""
+    try:
+        conn = get_db_connection()
+        apply_migrations(conn)
         conn.close()
+        return True
         
     except sqlite3.Error as e:
         print(f"Database error: {e}")
@@ -108,6 +1007,147 @@ def init_database():
         print(f"General error: {e}")
         if 'conn' in locals():
             conn.close()
+    return False
+
+def is_schema_current():
+    """Check whether every migration has been applied to the database"""
+    conn = get_db_connection()
+    try:
+        return get_schema_version(conn) >= SCHEMA_VERSION
+    finally:
+        conn.close()
+
+def bootstrap_database():
+    """Bring the schema up to date once per server process
+    
+    Streamlit re-runs app.py on every interaction; after the first run this
+    is a flag check. A file lock serializes first start-up across processes.
+    Migration errors propagate and the next run tries again.
+    """
+    global _bootstrapped
+    
+    if _bootstrapped:
+        return
+    
+    with _bootstrap_lock:
+        if _bootstrapped:
+            return
+        
+        if not is_schema_current():
+            with open(DATABASE_PATH + ".init.lock", "w") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    conn = get_db_connection()
+                    try:
+                        apply_migrations(conn)
+                    finally:
+                        conn.close()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        
+        _bootstrapped = is_schema_current()
+
+def get_summary_counters(conn=None):
+    """Get the trigger-maintained totals as a dict"""
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    
+    cursor = conn.cursor()
+    cursor.execute("SELECT name, value FROM summary_counters")
+    counters = {row['name']: row['value'] for row in cursor.fetchall()}
+    
+    if own_conn:
+        conn.close()
+    
+    return counters
+
+def refresh_summary_counters():
+    """Rebuild the summary counters in one transaction"""
+    conn = get_db_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rebuild_summary_counters(conn.cursor())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def refresh_feedback_rollup(since_day=None):
+    """Rebuild the daily feedback rollup in one transaction"""
+    conn = get_db_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rebuild_feedback_rollup(conn.cursor(), since_day)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def chunk_ids(ids, size=DELETE_CHUNK_SIZE):
+    """Split ids into lists of at most size, for IN (...) lists"""
+    ids = list(ids)
+    return [ids[start:start + size] for start in range(0, len(ids), size)]
+
+def delete_users(user_ids):
+    """Delete users with their predictions and feedback in one transaction, returning how many were deleted"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    deleted = 0
+    
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for chunk in chunk_ids(user_ids):
+            placeholders = ", ".join("?" * len(chunk))
+            # The rollup is not covered by the cascade; take the feedback out first
+            retract_feedback_rollup(cursor, f"f.user_id IN ({placeholders}) OR p.user_id IN ({placeholders})", chunk * 2)
+            cursor.execute(f"DELETE FROM users WHERE id IN ({placeholders})", chunk)
+            deleted += cursor.rowcount
+        # Tells every server process to re-check its cached identities
+        bump_data_version(cursor, 'users')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    return deleted
+
+def delete_doctors(doctor_ids):
+    """Delete doctors and their disease mappings in one transaction, returning how many were deleted"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    deleted = 0
+    
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for chunk in chunk_ids(doctor_ids):
+            placeholders = ", ".join("?" * len(chunk))
+            cursor.execute(f"DELETE FROM doctors WHERE id IN ({placeholders})", chunk)
+            deleted += cursor.rowcount
+        bump_data_version(cursor, 'doctors')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    return deleted
+
+def get_data_version(name):
+    """Get the current version of a reference dataset (0 if never written)"""
+    conn = get_db_connection()
+    row = conn.execute("SELECT version FROM data_versions WHERE name = ?", (name,)).fetchone()
+    conn.close()
+    return row[0] if row else 0
 
 def hash_password(password):
     """Hash password using SHA256"""
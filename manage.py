@@ -0,0 +1,110 @@
+import argparse
+from database import bootstrap_database, refresh_summary_counters, refresh_feedback_rollup, delete_users
+from utils.archive import run_retention, enable_incremental_vacuum, RETENTION_DAYS, ARCHIVE_BATCH_SIZE
+from utils.image_store import collect_garbage, GC_GRACE_SECONDS
+from utils.image_hash import backfill_image_hashes
+from utils.backup import run_backup, list_backups, verify_backup, BACKUP_KEEP, BACKUP_PAGES_PER_STEP
+
+def rebuild_counters(args):
+    """Recompute trigger-maintained counters from the base tables"""
+    refresh_summary_counters()
+    print("Summary counters rebuilt")
+
+def rebuild_feedback_rollup(args):
+    """Backfill or recompute the daily feedback rollup"""
+    refresh_feedback_rollup(args.since)
+    print(f"Feedback rollup rebuilt{' from ' + args.since if args.since else ''}")
+
+def purge_users(args):
+    """Delete users and all their data in one transaction"""
+    user_ids = list(args.user_ids)
+    if args.file:
+        with open(args.file) as id_file:
+            user_ids.extend(int(line) for line in id_file if line.strip())
+    
+    deleted = delete_users(user_ids)
+    print(f"Deleted {deleted} of {len(user_ids)} user(s) with their predictions and feedback")
+
+def archive_old_predictions(args):
+    """Move old predictions and their feedback into yearly archive databases"""
+    moved = run_retention(args.days, args.batch_size)
+    for year, count in moved.items():
+        print(f"Archived {count} prediction(s) from {year}")
+    print(f"Archived {sum(moved.values())} prediction(s) older than {args.days} days")
+
+def convert_incremental_vacuum(args):
+    """One-off switch to incremental auto-vacuum (runs a full VACUUM)"""
+    if enable_incremental_vacuum():
+        print("Incremental auto-vacuum enabled")
+    else:
+        print("Could not enable incremental auto-vacuum")
+
+def backup_database(args):
+    """Take an online backup without blocking writers, then rotate old ones"""
+    stats = run_backup(args.keep, args.pages)
+    print(f"Backup written to {stats['file']} ({stats['bytes'] / (1024 * 1024):.1f} MB, {stats['pages']} pages in {stats['steps']} steps)")
+    print(f"Took {stats['seconds']:.2f}s ({stats['mb_per_second']:.1f} MB/s), sha256 {stats['sha256']}")
+    if stats['rotated']:
+        print(f"Removed {stats['rotated']} old backup(s)")
+
+def verify_backups(args):
+    """Check every backup file against its stored checksum"""
+    failed = 0
+    for path in list_backups():
+        ok = verify_backup(path)
+        failed += not ok
+        print(f"{'OK' if ok else 'FAILED'}  {path}")
+    if failed:
+        raise SystemExit(f"{failed} backup(s) failed verification")
+
+def collect_image_garbage(args):
+    """Remove stored images that no prediction references any more"""
+    removed, freed = collect_garbage(args.grace)
+    print(f"Removed {removed} unreferenced image(s), freed {freed / (1024 * 1024):.1f} MB")
+
+def backfill_hashes(args):
+    """Hash stored images of older predictions and link repeat uploads"""
+    hashed, linked = backfill_image_hashes()
+    print(f"Hashed {hashed} prediction image(s), linked {linked} repeat upload(s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Skin Disease Detection System maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    subparsers.add_parser("rebuild-counters", help="Recompute summary counters and per-user activity").set_defaults(func=rebuild_counters)
+    
+    rollup_parser = subparsers.add_parser("rebuild-feedback-rollup", help="Recompute the daily feedback rollup")
+    rollup_parser.add_argument("--since", help="Only recompute days on or after this date (YYYY-MM-DD)")
+    rollup_parser.set_defaults(func=rebuild_feedback_rollup)
+    
+    purge_parser = subparsers.add_parser("delete-users", help="Delete users with their predictions and feedback")
+    purge_parser.add_argument("user_ids", nargs="*", type=int, help="User ids to delete")
+    purge_parser.add_argument("--file", help="File with one user id per line")
+    purge_parser.set_defaults(func=purge_users)
+    
+    archive_parser = subparsers.add_parser("archive", help="Move old predictions and feedback into yearly archive databases")
+    archive_parser.add_argument("--days", type=int, default=RETENTION_DAYS, help=f"Keep predictions newer than this many days (default {RETENTION_DAYS})")
+    archive_parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="Predictions moved per transaction")
+    archive_parser.set_defaults(func=archive_old_predictions)
+    
+    subparsers.add_parser("enable-incremental-vacuum", help="Convert the database to incremental auto-vacuum (one full VACUUM; run when quiet)").set_defaults(func=convert_incremental_vacuum)
+    
+    backup_parser = subparsers.add_parser("backup", help="Take an online, checksummed backup of the database")
+    backup_parser.add_argument("--keep", type=int, default=BACKUP_KEEP, help=f"Number of backups to keep (default {BACKUP_KEEP})")
+    backup_parser.add_argument("--pages", type=int, default=BACKUP_PAGES_PER_STEP, help="Pages copied per backup step")
+    backup_parser.set_defaults(func=backup_database)
+    
+    subparsers.add_parser("verify-backups", help="Check backup files against their checksums").set_defaults(func=verify_backups)
+    
+    gc_parser = subparsers.add_parser("gc-images", help="Delete stored images no prediction references")
+    gc_parser.add_argument("--grace", type=int, default=GC_GRACE_SECONDS, help="Keep files written within this many seconds")
+    gc_parser.set_defaults(func=collect_image_garbage)
+    
+    subparsers.add_parser("backfill-image-hashes", help="Compute perceptual hashes for stored images and link repeat uploads").set_defaults(func=backfill_hashes)
+    
+    args = parser.parse_args()
+    bootstrap_database()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,16 @@ from PIL import Image
 import streamlit as st
 import os
 import random
+import threading
+
+# Model input geometry
+MODEL_INPUT_SIZE = (224, 224)
+MODEL_INPUT_CHANNELS = 3
+
+# Preallocated float32 input slabs, kept per batch size and reused across requests
+MAX_POOLED_BUFFERS = 4
+_input_buffer_pool = {}
+_input_buffer_lock = threading.Lock()
 
 # Disease classes that the model can predict - Updated to match Kaggle dataset
 DISEASE_CLASSES = [
@@ -82,15 +92,44 @@ def load_model():
         st.error(f"Error loading model: {str(e)}")
         return None
 
-def preprocess_image(image):
-    """Preprocess uploaded image for model prediction"""
+def acquire_input_buffer(batch_size=1):
+    """Get a (batch_size, 224, 224, 3) float32 buffer from the pool"""
+    with _input_buffer_lock:
+        free_buffers = _input_buffer_pool.get(batch_size)
+        if free_buffers:
+            return free_buffers.pop()
+    
+    return np.empty((batch_size, *MODEL_INPUT_SIZE, MODEL_INPUT_CHANNELS), dtype=np.float32)
+
+def release_input_buffer(buffer):
+    """Return a buffer to the pool once inference no longer needs it"""
+    with _input_buffer_lock:
+        free_buffers = _input_buffer_pool.setdefault(buffer.shape[0], [])
+        if len(free_buffers) < MAX_POOLED_BUFFERS:
+            free_buffers.append(buffer)
+
+def resize_for_model(image):
+    """Convert to RGB and resize to the model input size (uint8 pixels, before normalizing)"""
+    # Convert to RGB if necessary
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    
+    # Resize to model input size (assuming 224x224)
+    return image.resize(MODEL_INPUT_SIZE)
+
+def preprocess_image(image, out=None):
+    """Preprocess uploaded image for model prediction
+    
+    When out is given (a (224, 224, 3) float32 slot of a pooled buffer) the
+    normalized pixels are written into it instead of a fresh array.
+    """
     try:
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        image = resize_for_model(image)
         
-        # Resize to model input size (assuming 224x224)
-        image = image.resize((224, 224))
+        if out is not None:
+            # Normalize straight into the caller's slot, no float copy
+            np.multiply(np.asarray(image), np.float32(1.0 / 255.0), out=out)
+            return out[np.newaxis]
         
         # Convert to numpy array
         img_array = np.array(image)
@@ -1,6 +1,13 @@
 import streamlit as st
-from database import get_db_connection
+from database import get_analytics_connection, get_summary_counters, refresh_summary_counters
 import pandas as pd
+from utils.cache import get_cache_stats
+from utils.renditions import get_rendition_stats
+from utils.analytics import show_snapshot_status, refresh_after_write
+from utils.backup import run_backup, get_backup_summary, get_last_backup
+
+# Largest repeat-upload clusters listed on the dashboard
+DUPLICATE_CLUSTER_LIMIT = 50
 
 def show_admin_panel():
     """Main admin panel dashboard"""
@@ -39,22 +46,15 @@ def show_admin_panel():
 def show_statistics():
     """Show system statistics"""
     st.subheader("📊 System Statistics")
+    show_snapshot_status("admin")
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get various statistics
-    cursor.execute("SELECT COUNT(*) FROM users WHERE is_admin = 0")
-    total_users = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM doctors")
-    total_doctors = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM predictions")
-    total_predictions = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM feedback")
-    total_feedback = cursor.fetchone()[0]
+    # Trigger-maintained totals instead of COUNT(*) scans, read from the reporting snapshot
+    conn = get_analytics_connection()
+    counters = get_summary_counters(conn=conn)
+    total_users = counters.get('users', 0)
+    total_doctors = counters.get('doctors', 0)
+    total_predictions = counters.get('predictions', 0)
+    total_feedback = counters.get('feedback', 0)
     
     # Display in columns
     col1, col2, col3, col4 = st.columns(4)
@@ -72,10 +72,11 @@ def show_statistics():
         st.metric("Feedback Received", total_feedback)
     
     # Disease prediction statistics
+    cursor = conn.cursor()
     cursor.execute('''
-        SELECT predicted_disease, COUNT(*) as count 
-        FROM predictions 
-        GROUP BY predicted_disease 
+        SELECT predicted_disease, prediction_count AS count
+        FROM disease_prediction_counts
+        WHERE prediction_count > 0
         ORDER BY count DESC
     ''')
     
@@ -87,12 +88,115 @@ def show_statistics():
         st.bar_chart(disease_df.set_index('Disease'))
     
     conn.close()
+    
+    if st.button("🔄 Rebuild Counters", help="Recompute the totals above from the underlying tables"):
+        refresh_summary_counters()
+        refresh_after_write()
+        st.success("Counters rebuilt")
+        st.rerun()
+    
+    # Process-wide reference data cache (shared by all sessions on this server)
+    cache_stats = get_cache_stats()
+    if cache_stats:
+        with st.expander("⚡ Reference Data Cache"):
+            cache_df = pd.DataFrame([
+                {
+                    'Dataset': dataset,
+                    'Hits': stats['hits'],
+                    'Misses': stats['misses'],
+                    'Hit Rate': f"{stats['hit_rate']:.1%}",
+                    'Cached Entries': stats['entries'],
+                    'Invalidations': stats['invalidations']
+                }
+                for dataset, stats in cache_stats.items()
+            ])
+            st.dataframe(cache_df, use_container_width=True, hide_index=True)
+    
+    # Pre-encoded image renditions for uploads and history thumbnails
+    rendition_stats = get_rendition_stats()
+    if rendition_stats['hits'] + rendition_stats['misses']:
+        with st.expander("🖼️ Image Rendition Cache"):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Hit Rate", f"{rendition_stats['hit_rate']:.1%}")
+            with col2:
+                st.metric("Cached Images", rendition_stats['entries'])
+            with col3:
+                st.metric("Cache Size", f"{rendition_stats['bytes'] / (1024 * 1024):.1f} MB")
+            st.caption(f"{rendition_stats['evictions']} least recently used rendition(s) evicted to stay within the memory limit")
+    
+    show_duplicate_clusters()
+    show_backups()
+
+def show_duplicate_clusters():
+    """List pictures that were analyzed more than once (near-duplicate uploads)"""
+    with st.expander("🧬 Repeat Uploads"):
+        conn = get_analytics_connection()
+        cursor = conn.cursor()
+        
+        # Each repeat points at the first prediction of its picture
+        cursor.execute('''
+            SELECT r.id, u.username, r.predicted_disease, r.created_at,
+                   COUNT(d.id) AS repeats,
+                   SUM(d.predicted_disease <> r.predicted_disease) AS changed,
+                   MAX(d.created_at) AS last_repeat
+            FROM predictions d
+            JOIN predictions r ON d.duplicate_of = r.id
+            LEFT JOIN users u ON r.user_id = u.id
+            GROUP BY r.id
+            ORDER BY repeats DESC, last_repeat DESC
+            LIMIT ?
+        ''', (DUPLICATE_CLUSTER_LIMIT,))
+        clusters = cursor.fetchall()
+        conn.close()
+        
+        if clusters:
+            clusters_df = pd.DataFrame([
+                {
+                    'First Prediction': cluster['id'],
+                    'User': cluster['username'],
+                    'First Diagnosis': cluster['predicted_disease'],
+                    'First Analyzed': cluster['created_at'][:19],
+                    'Repeats': cluster['repeats'],
+                    'Different Diagnosis': cluster['changed'],
+                    'Last Repeat': cluster['last_repeat'][:19]
+                }
+                for cluster in clusters
+            ])
+            st.dataframe(clusters_df, use_container_width=True, hide_index=True)
+        else:
+            st.info("No picture has been analyzed more than once.")
+
+def show_backups():
+    """Show the database backups on disk and take one on demand"""
+    with st.expander("💾 Database Backups"):
+        backups = get_backup_summary()
+        if backups:
+            backups_df = pd.DataFrame(backups)
+            backups_df.columns = ['File', 'Created', 'Size (MB)', 'Checksum']
+            st.dataframe(backups_df, use_container_width=True, hide_index=True)
+        else:
+            st.info("No backups yet.")
+        
+        last_backup = get_last_backup()
+        if last_backup:
+            st.caption(
+                f"Last backup on this server: {last_backup['file']}, "
+                f"{last_backup['bytes'] / (1024 * 1024):.1f} MB in {last_backup['seconds']:.2f}s "
+                f"({last_backup['mb_per_second']:.1f} MB/s)"
+            )
+        
+        if st.button("💾 Back Up Now", help="Copy the database while the app keeps running"):
+            with st.spinner("Backing up..."):
+                stats = run_backup()
+            st.success(f"Backup {stats['file']} written in {stats['seconds']:.2f}s")
+            st.rerun()
 
 def show_recent_activity():
     """Show recent system activity"""
     st.subheader("📋 Recent Activity")
     
-    conn = get_db_connection()
+    conn = get_analytics_connection()
     cursor = conn.cursor()
     
     # Recent predictions
@@ -1,29 +1,65 @@
 import streamlit as st
-from database import get_db_connection
+from database import get_db_connection, bump_data_version, sync_doctor_diseases, index_doctor_diseases, delete_doctors
 import pandas as pd
+import sqlite3
+from utils.pagination import count_rows, fetch_page, show_pagination_controls
+from utils.cache import cached_lookup, invalidate_cache
+from utils.bulk_import import read_import_chunks, reject_rows, reject_missing, show_bulk_import_form, EMAIL_PATTERN
+
+# Sort choices for the doctor list (always tie-broken by id for stable pages)
+DOCTOR_SORT_OPTIONS = {
+    "Name (A-Z)": "name ASC, id ASC",
+    "Most experienced": "experience_years DESC, name ASC, id ASC",
+    "Recently added": "created_at DESC, id DESC"
+}
+
+# Bulk import CSV layout
+DOCTOR_IMPORT_COLUMNS = ["name", "specialization", "diseases_treated"]
+DOCTOR_IMPORT_OPTIONAL_COLUMNS = ["contact_email", "contact_phone", "address", "experience_years"]
+MAX_EXPERIENCE_YEARS = 50
 
 def show_doctor_management():
     """Doctor management interface"""
     st.title("👨‍⚕️ Doctor Management")
     
-    tab1, tab2 = st.tabs(["View Doctors", "Add/Edit Doctor"])
+    tab1, tab2, tab3 = st.tabs(["View Doctors", "Add/Edit Doctor", "Bulk Import"])
     
     with tab1:
         show_doctors_list()
     
     with tab2:
         show_doctor_form()
+    
+    with tab3:
+        st.subheader("Import Doctors from CSV")
+        show_bulk_import_form(
+            "doctors",
+            "Columns: **name**, **specialization**, **diseases_treated** (comma-separated, quote the field), "
+            "contact_email, contact_phone, address, experience_years (optional). Invalid rows are skipped and listed below.",
+            import_doctors
+        )
 
 def show_doctors_list():
     """Display list of all doctors with edit/delete options"""
     st.subheader("Registered Doctors")
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    total_doctors = count_rows("FROM doctors")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        search = st.text_input("Search name, specialization or condition:", key="doctor_search")
+    with col2:
+        sort_label = st.selectbox("Sort by:", list(DOCTOR_SORT_OPTIONS), key="doctor_sort")
     
-    cursor.execute("SELECT * FROM doctors ORDER BY name")
-    doctors = cursor.fetchall()
-    conn.close()
+    filters = []
+    params = []
+    if search:
+        filters.append("name LIKE ? OR specialization LIKE ? OR diseases_treated LIKE ?")
+        params.extend([f"%{search}%"] * 3)
+    
+    matching = count_rows("FROM doctors", filters, params)
+    page, page_size = show_pagination_controls("doctors", matching)
+    doctors = fetch_page("*", "FROM doctors", filters, params, DOCTOR_SORT_OPTIONS[sort_label], page, page_size)
     
     if doctors:
         # Convert to DataFrame for better display
@@ -69,6 +105,22 @@ def show_doctors_list():
                     else:
                         st.session_state.confirm_delete = doctor_id
                         st.warning("Click again to confirm deletion")
+        
+        # Bulk delete from the current page
+        with st.expander("🗑️ Delete Several Doctors"):
+            selected_doctors = st.multiselect("Doctors to delete:", doctor_options, key="bulk_delete_doctors")
+            if selected_doctors and st.button(f"Delete {len(selected_doctors)} doctor(s)", key="bulk_delete_doctors_btn"):
+                doctor_ids = [int(option.split(" - ")[0]) for option in selected_doctors]
+                if st.session_state.get('confirm_bulk_delete_doctors') == doctor_ids:
+                    if delete_selected_doctors(doctor_ids):
+                        st.success(f"Deleted {len(doctor_ids)} doctor(s)")
+                        del st.session_state.confirm_bulk_delete_doctors
+                        st.rerun()
+                else:
+                    st.session_state.confirm_bulk_delete_doctors = doctor_ids
+                    st.warning("Click again to confirm deletion")
+    elif total_doctors:
+        st.info("No doctors match the search.")
     else:
         st.info("No doctors registered yet.")
 
@@ -81,11 +133,7 @@ def show_doctor_form():
         doctor_id = st.session_state.edit_doctor_id
         
         # Get doctor data
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM doctors WHERE id = ?", (doctor_id,))
-        doctor = cursor.fetchone()
-        conn.close()
+        doctor = get_doctor(doctor_id)
         
         if not doctor:
             st.error("Doctor not found!")
@@ -121,7 +169,7 @@ def show_doctor_form():
             experience_years = st.number_input(
                 "Years of Experience", 
                 min_value=0, 
-                max_value=50, 
+                max_value=MAX_EXPERIENCE_YEARS, 
                 value=int(doctor['experience_years']) if doctor else 0
             )
             address = st.text_input(
@@ -167,6 +215,18 @@ def show_doctor_form():
             del st.session_state.edit_doctor_id
             st.rerun()
 
+def get_doctor(doctor_id):
+    """Get one doctor by id, served from the reference data cache"""
+    def load_doctor():
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM doctors WHERE id = ?", (doctor_id,))
+        doctor = cursor.fetchone()
+        conn.close()
+        return doctor
+    
+    return cached_lookup('doctors', ('by_id', doctor_id), load_doctor)
+
 def add_doctor(name, specialization, contact_email, contact_phone, address, experience_years, diseases_treated):
     """Add new doctor to database"""
     try:
@@ -177,14 +237,77 @@ def add_doctor(name, specialization, contact_email, contact_phone, address, expe
             INSERT INTO doctors (name, specialization, contact_email, contact_phone, address, experience_years, diseases_treated)
             VALUES (?, ?, ?, ?, ?, ?, ?)
         ''', (name, specialization, contact_email, contact_phone, address, experience_years, diseases_treated))
+        sync_doctor_diseases(cursor, cursor.lastrowid, specialization, diseases_treated)
+        bump_data_version(cursor, 'doctors')
         
         conn.commit()
         conn.close()
+        invalidate_cache('doctors')
         return True
     except Exception as e:
         st.error(f"Error adding doctor: {str(e)}")
         return False
 
+def import_doctors(source):
+    """Validate a doctors CSV and insert every valid row in one transaction
+    
+    Returns (imported_count, errors) with one error entry per rejected row.
+    """
+    errors = []
+    rows = []
+    
+    try:
+        for chunk in read_import_chunks(source, DOCTOR_IMPORT_COLUMNS, DOCTOR_IMPORT_OPTIONAL_COLUMNS):
+            chunk = reject_missing(chunk, DOCTOR_IMPORT_COLUMNS, errors)
+            
+            has_email = chunk['contact_email'] != ""
+            chunk = reject_rows(chunk, has_email & ~chunk['contact_email'].str.match(EMAIL_PATTERN), "Invalid contact_email", errors)
+            
+            experience = pd.to_numeric(chunk['experience_years'].replace("", "0"), errors='coerce')
+            invalid_experience = experience.isna() | (experience < 0) | (experience > MAX_EXPERIENCE_YEARS) | (experience % 1 != 0)
+            chunk = reject_rows(chunk, invalid_experience, f"experience_years must be a whole number from 0 to {MAX_EXPERIENCE_YEARS}", errors)
+            experience = experience[~invalid_experience].astype(int)
+            
+            rows.extend(zip(
+                chunk['name'].tolist(),
+                chunk['specialization'].tolist(),
+                chunk['contact_email'].tolist(),
+                chunk['contact_phone'].tolist(),
+                chunk['address'].tolist(),
+                experience.tolist(),
+                chunk['diseases_treated'].tolist()
+            ))
+    except ValueError as e:
+        return 0, [{'Row': None, 'Error': str(e)}]
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        
+        # Holding the write lock, every id above the current maximum is one of ours
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM doctors")
+        last_id = cursor.fetchone()[0]
+        
+        cursor.executemany('''
+            INSERT INTO doctors (name, specialization, contact_email, contact_phone, address, experience_years, diseases_treated)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        
+        cursor.execute("SELECT id, specialization, diseases_treated FROM doctors WHERE id > ?", (last_id,))
+        index_doctor_diseases(cursor, cursor.fetchall())
+        bump_data_version(cursor, 'doctors')
+        
+        conn.commit()
+        conn.close()
+        invalidate_cache('doctors')
+    except sqlite3.Error as e:
+        conn.close()
+        return 0, errors + [{'Row': None, 'Error': f"Import rolled back: {str(e)}"}]
+    
+    return len(rows), sorted(errors, key=lambda error: error['Row'])
+
 def update_doctor(doctor_id, name, specialization, contact_email, contact_phone, address, experience_years, diseases_treated):
     """Update existing doctor"""
     try:
@@ -196,9 +319,12 @@ def update_doctor(doctor_id, name, specialization, contact_email, contact_phone,
             SET name=?, specialization=?, contact_email=?, contact_phone=?, address=?, experience_years=?, diseases_treated=?
             WHERE id=?
         ''', (name, specialization, contact_email, contact_phone, address, experience_years, diseases_treated, doctor_id))
+        sync_doctor_diseases(cursor, doctor_id, specialization, diseases_treated)
+        bump_data_version(cursor, 'doctors')
         
         conn.commit()
         conn.close()
+        invalidate_cache('doctors')
         return True
     except Exception as e:
         st.error(f"Error updating doctor: {str(e)}")
@@ -206,14 +332,14 @@ def update_doctor(doctor_id, name, specialization, contact_email, contact_phone,
 
 def delete_doctor(doctor_id):
     """Delete doctor from database"""
+    return delete_selected_doctors([doctor_id])
+
+def delete_selected_doctors(doctor_ids):
+    """Delete doctors and their disease mappings (cascaded) in one transaction"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("DELETE FROM doctors WHERE id = ?", (doctor_id,))
-        conn.commit()
-        conn.close()
+        delete_doctors(doctor_ids)
+        invalidate_cache('doctors')
         return True
     except Exception as e:
-        st.error(f"Error deleting doctor: {str(e)}")
+        st.error(f"Error deleting doctors: {str(e)}")
         return False
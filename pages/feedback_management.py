@@ -1,12 +1,33 @@
 import streamlit as st
-from database import get_db_connection
+import os
+from database import get_analytics_connection, get_summary_counters
 import pandas as pd
 import plotly.express as px
+from utils.pagination import count_rows, fetch_page, show_pagination_controls
+from utils.data_export import EXPORT_DATASETS, create_export_file, iter_query_chunks, parquet_available
+from utils.analytics import show_snapshot_status
+
+# Sort choices for the feedback list (always tie-broken by id for stable pages)
+FEEDBACK_SORT_OPTIONS = {
+    "Newest first": "f.created_at DESC, f.id DESC",
+    "Oldest first": "f.created_at ASC, f.id ASC",
+    "Highest rating": "f.rating DESC, f.created_at DESC, f.id DESC",
+    "Lowest rating": "f.rating ASC, f.created_at DESC, f.id DESC"
+}
+
+FEEDBACK_FROM = '''
+    FROM feedback f
+    JOIN users u ON f.user_id = u.id
+    JOIN predictions p ON f.prediction_id = p.id
+'''
 
 def show_feedback_management():
     """Feedback management interface"""
     st.title("💬 Feedback Management")
     
+    # Everything on this page reads the reporting snapshot
+    show_snapshot_status("feedback")
+    
     tab1, tab2, tab3 = st.tabs(["All Feedback", "Analytics", "Export"])
     
     with tab1:
@@ -22,22 +43,10 @@ def show_all_feedback():
     """Display all feedback with filtering options"""
     st.subheader("User Feedback")
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get all feedback with user and prediction details
-    cursor.execute('''
-        SELECT f.*, u.username, p.predicted_disease, p.confidence_score
-        FROM feedback f
-        JOIN users u ON f.user_id = u.id
-        JOIN predictions p ON f.prediction_id = p.id
-        ORDER BY f.created_at DESC
-    ''')
-    
-    feedback_data = cursor.fetchall()
-    conn.close()
+    conn = get_analytics_connection()
+    total_feedback = count_rows("FROM feedback", conn=conn)
     
-    if feedback_data:
+    if total_feedback:
         # Filter options
         col1, col2, col3 = st.columns(3)
         
@@ -45,21 +54,34 @@ def show_all_feedback():
             min_rating = st.selectbox("Minimum Rating:", [1, 2, 3, 4, 5], index=0)
         
         with col2:
-            diseases = list(set([fb['predicted_disease'] for fb in feedback_data]))
+            diseases = get_predicted_diseases()
             selected_disease = st.selectbox("Filter by Disease:", ["All"] + diseases)
         
         with col3:
-            # Date range filter could be added here
-            st.write("") # Placeholder
+            sort_label = st.selectbox("Sort by:", list(FEEDBACK_SORT_OPTIONS))
         
-        # Apply filters
-        filtered_feedback = []
-        for fb in feedback_data:
-            if fb['rating'] >= min_rating:
-                if selected_disease == "All" or fb['predicted_disease'] == selected_disease:
-                    filtered_feedback.append(fb)
+        # Filters are applied in SQL
+        filters = ["f.rating >= ?"]
+        params = [min_rating]
+        if selected_disease != "All":
+            filters.append("p.predicted_disease = ?")
+            params.append(selected_disease)
         
-        st.write(f"Showing {len(filtered_feedback)} of {len(feedback_data)} feedback entries")
+        matching = count_rows(FEEDBACK_FROM, filters, params, conn=conn)
+        st.write(f"{matching} of {total_feedback} feedback entries match the filters")
+        
+        page, page_size = show_pagination_controls("feedback", matching)
+        filtered_feedback = fetch_page(
+            "f.*, u.username, p.predicted_disease, p.confidence_score",
+            FEEDBACK_FROM,
+            filters,
+            params,
+            FEEDBACK_SORT_OPTIONS[sort_label],
+            page,
+            page_size,
+            conn=conn
+        )
+        conn.close()
         
         # Display feedback
         for fb in filtered_feedback:
@@ -81,23 +103,35 @@ def show_all_feedback():
                         mark_feedback_reviewed(fb['id'])
                         st.success("Marked as reviewed")
     else:
+        conn.close()
         st.info("No feedback received yet.")
 
+def get_predicted_diseases():
+    """Get the distinct predicted diseases (read from the disease index)"""
+    conn = get_analytics_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT DISTINCT predicted_disease FROM predictions ORDER BY predicted_disease")
+    diseases = [row[0] for row in cursor.fetchall() if row[0]]
+    conn.close()
+    
+    return diseases
+
 def show_feedback_analytics():
     """Show feedback analytics and insights"""
     st.subheader("Feedback Analytics")
     
-    conn = get_db_connection()
+    conn = get_analytics_connection()
     cursor = conn.cursor()
     
-    # Overall statistics
+    # Overall statistics (all charts read the daily rollup, not the feedback table)
     cursor.execute('''
         SELECT 
-            AVG(rating) as avg_rating,
-            COUNT(*) as total_feedback,
-            COUNT(CASE WHEN rating >= 4 THEN 1 END) as positive_feedback,
-            COUNT(CASE WHEN rating <= 2 THEN 1 END) as negative_feedback
-        FROM feedback
+            SUM(rating_sum) * 1.0 / SUM(feedback_count) as avg_rating,
+            COALESCE(SUM(feedback_count), 0) as total_feedback,
+            COALESCE(SUM(CASE WHEN rating >= 4 THEN feedback_count END), 0) as positive_feedback,
+            COALESCE(SUM(CASE WHEN rating <= 2 THEN feedback_count END), 0) as negative_feedback
+        FROM feedback_daily_rollup
     ''')
     
     stats = cursor.fetchone()
@@ -121,9 +155,10 @@ def show_feedback_analytics():
         
         # Rating distribution
         cursor.execute('''
-            SELECT rating, COUNT(*) as count
-            FROM feedback
+            SELECT rating, SUM(feedback_count) as count
+            FROM feedback_daily_rollup
             GROUP BY rating
+            HAVING count > 0
             ORDER BY rating
         ''')
         
@@ -137,10 +172,11 @@ def show_feedback_analytics():
         
         # Feedback by disease
         cursor.execute('''
-            SELECT p.predicted_disease, AVG(f.rating) as avg_rating, COUNT(f.id) as feedback_count
-            FROM feedback f
-            JOIN predictions p ON f.prediction_id = p.id
-            GROUP BY p.predicted_disease
+            SELECT predicted_disease, SUM(rating_sum) * 1.0 / SUM(feedback_count) as avg_rating, SUM(feedback_count) as feedback_count
+            FROM feedback_daily_rollup
+            WHERE predicted_disease != ''
+            GROUP BY predicted_disease
+            HAVING feedback_count > 0
             ORDER BY feedback_count DESC
         ''')
         
@@ -166,10 +202,11 @@ def show_feedback_analytics():
         
         # Recent trends
         cursor.execute('''
-            SELECT DATE(created_at) as date, AVG(rating) as avg_rating, COUNT(*) as count
-            FROM feedback
-            WHERE created_at >= datetime('now', '-30 days')
-            GROUP BY DATE(created_at)
+            SELECT day as date, SUM(rating_sum) * 1.0 / SUM(feedback_count) as avg_rating, SUM(feedback_count) as count
+            FROM feedback_daily_rollup
+            WHERE day >= date('now', '-30 days')
+            GROUP BY day
+            HAVING count > 0
             ORDER BY date
         ''')
         
@@ -189,78 +226,102 @@ def show_feedback_analytics():
     conn.close()
 
 def show_export_options():
-    """Show options to export feedback data"""
-    st.subheader("Export Feedback Data")
+    """Show options to export feedback and prediction data"""
+    st.subheader("Export Data")
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    conn = get_analytics_connection()
+    counters = get_summary_counters(conn=conn)
+    conn.close()
     
-    cursor.execute('''
-        SELECT f.*, u.username, p.predicted_disease, p.confidence_score
-        FROM feedback f
-        JOIN users u ON f.user_id = u.id
-        JOIN predictions p ON f.prediction_id = p.id
-        ORDER BY f.created_at DESC
-    ''')
+    col1, col2 = st.columns(2)
     
-    feedback_data = cursor.fetchall()
-    conn.close()
+    with col1:
+        dataset = st.selectbox("Dataset:", ["feedback", "predictions"], format_func=str.title)
     
-    if feedback_data:
-        # Convert to DataFrame
-        export_data = []
-        for fb in feedback_data:
-            export_data.append({
-                'Feedback ID': fb['id'],
-                'Username': fb['username'],
-                'Predicted Disease': fb['predicted_disease'],
-                'Model Confidence': fb['confidence_score'],
-                'User Rating': fb['rating'],
-                'Comments': fb['comments'],
-                'Date': fb['created_at']
-            })
-        
-        df = pd.DataFrame(export_data)
-        
+    with col2:
+        formats = ["csv", "parquet"] if parquet_available() else ["csv"]
+        file_format = st.selectbox("Format:", formats, format_func=str.upper)
+    
+    total_records = counters.get(dataset, 0)
+    
+    if total_records:
         # Display summary
-        st.write(f"Total records to export: {len(df)}")
+        st.write(f"Total records to export: {total_records}")
         
         # Preview data
         st.subheader("Data Preview")
-        st.dataframe(df.head(10), use_container_width=True)
+        definition = EXPORT_DATASETS[dataset]
+        preview_rows = next(iter_query_chunks(definition['query'], chunk_size=10), [])
+        preview_df = pd.DataFrame([tuple(row) for row in preview_rows], columns=[name for name, _ in definition['columns']])
+        st.dataframe(preview_df, use_container_width=True)
         
         # Export options
         col1, col2 = st.columns(2)
         
         with col1:
-            if st.button("📊 Download as CSV", use_container_width=True):
-                csv = df.to_csv(index=False)
-                st.download_button(
-                    label="Click to Download CSV",
-                    data=csv,
-                    file_name=f"feedback_export_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv"
-                )
+            if st.button(f"📊 Prepare {file_format.upper()} Export", use_container_width=True):
+                with st.spinner("Writing export file..."):
+                    # Rows are streamed from the cursor into a temp file in fixed-size chunks
+                    path, row_count = create_export_file(dataset, file_format)
+                
+                previous = st.session_state.get('export_file')
+                if previous and os.path.exists(previous['path']):
+                    os.remove(previous['path'])
+                st.session_state.export_file = {
+                    'path': path,
+                    'file_name': f"{dataset}_export_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.{file_format}",
+                    'mime': "text/csv" if file_format == "csv" else "application/vnd.apache.parquet",
+                    'rows': row_count
+                }
+            
+            export_file = st.session_state.get('export_file')
+            if export_file and os.path.exists(export_file['path']):
+                with open(export_file['path'], 'rb') as export_data:
+                    st.download_button(
+                        label=f"Click to Download {export_file['file_name']} ({export_file['rows']} rows)",
+                        data=export_data,
+                        file_name=export_file['file_name'],
+                        mime=export_file['mime']
+                    )
         
         with col2:
             if st.button("📋 Generate Summary Report", use_container_width=True):
-                generate_summary_report(df)
+                generate_summary_report()
     
     else:
-        st.info("No feedback data available to export.")
+        st.info(f"No {dataset} data available to export.")
 
-def generate_summary_report(df):
-    """Generate a summary report of the feedback"""
+def generate_summary_report():
+    """Generate a summary report of the feedback from the daily rollup"""
     st.subheader("📋 Feedback Summary Report")
     
-    total_feedback = len(df)
-    avg_rating = df['User Rating'].mean()
+    conn = get_analytics_connection()
+    cursor = conn.cursor()
     
     # Rating distribution
-    rating_counts = df['User Rating'].value_counts().sort_index()
+    cursor.execute('''
+        SELECT rating, SUM(feedback_count) AS count, SUM(rating_sum) AS rating_sum
+        FROM feedback_daily_rollup
+        GROUP BY rating
+    ''')
+    rating_rows = cursor.fetchall()
+    rating_counts = {row['rating']: row['count'] for row in rating_rows}
     
     # Most common diseases in feedback
-    disease_counts = df['Predicted Disease'].value_counts()
+    cursor.execute('''
+        SELECT predicted_disease, SUM(feedback_count) AS count
+        FROM feedback_daily_rollup
+        WHERE predicted_disease != ''
+        GROUP BY predicted_disease
+        HAVING count > 0
+        ORDER BY count DESC
+        LIMIT 5
+    ''')
+    disease_counts = cursor.fetchall()
+    conn.close()
+    
+    total_feedback = sum(rating_counts.values())
+    avg_rating = sum(row['rating_sum'] for row in rating_rows) / total_feedback if total_feedback else 0
     
     # Generate report text
     report = f"""
@@ -284,20 +345,19 @@ def generate_summary_report(df):
     ### Most Frequently Rated Diseases
     """
     
-    for disease, count in disease_counts.head(5).items():
-        percentage = (count / total_feedback) * 100
-        report += f"- {disease}: {count} ({percentage:.1f}%)\n"
+    for row in disease_counts:
+        percentage = (row['count'] / total_feedback) * 100
+        report += f"- {row['predicted_disease']}: {row['count']} ({percentage:.1f}%)\n"
     
     st.markdown(report)
     
     # Download report
-    if st.button("📄 Download Report as Text"):
-        st.download_button(
-            label="Click to Download Report",
-            data=report,
-            file_name=f"feedback_report_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.txt",
-            mime="text/plain"
-        )
+    st.download_button(
+        label="📄 Download Report as Text",
+        data=report,
+        file_name=f"feedback_report_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.txt",
+        mime="text/plain"
+    )
 
 def mark_feedback_reviewed(feedback_id):
     """Mark feedback as reviewed (could add a reviewed column to database)"""
@@ -1,37 +1,58 @@
 import streamlit as st
 from PIL import Image
 import io
-from model_utils import load_model, preprocess_image, predict_disease, get_disease_info, get_treatment_recommendations
-from database import get_db_connection
-from auth import get_user_id
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from model_utils import load_model, resize_for_model, preprocess_image, predict_disease, acquire_input_buffer, release_input_buffer, get_disease_info, get_treatment_recommendations
+from database import get_db_connection, record_feedback_rollup, GENERAL_DERMATOLOGY_KEY
+from utils.image_processing import assess_image_quality, crop_to_skin_roi
+from utils.cache import cached_lookup
+from utils.write_queue import submit_write, execute_write
+from utils.archive import list_archives, query_archives
+from utils.image_store import hash_image_bytes, store_image, get_thumbnail_path, THUMBNAIL_SIZE
+from utils.renditions import get_display_rendition
+from utils.image_hash import compute_image_hash, to_db_hash, find_near_duplicates, get_cluster_root
+
+# Small pool for the database work of the detection flow so it can overlap
+# with inference and rendering (Streamlit calls stay on the script thread)
+_pipeline_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="detection-io")
+
+# Page size choices for the prediction history
+HISTORY_PAGE_SIZES = [10, 25, 50]
 
 def show_user_dashboard():
     """Show user dashboard with prediction history"""
     st.subheader("My Profile & Prediction History")
     
-    user_id = get_user_id(st.session_state.username)
+    user_id = st.session_state.identity['user_id']
     
-    # Get user's prediction history
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    # Lightweight totals instead of counting the fetched history
+    totals = get_prediction_totals(user_id)
     
-    cursor.execute('''
-        SELECT p.*, f.rating, f.comments 
-        FROM predictions p 
-        LEFT JOIN feedback f ON p.id = f.prediction_id 
-        WHERE p.user_id = ? 
-        ORDER BY p.created_at DESC
-    ''', (user_id,))
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Total Predictions", totals['prediction_count'])
+    with col2:
+        st.metric("Last Prediction", totals['last_prediction'][:10] if totals['last_prediction'] else "Never")
     
-    predictions = cursor.fetchall()
-    conn.close()
+    page_size = st.selectbox("Predictions per page:", HISTORY_PAGE_SIZES, key="history_page_size")
+    
+    # Keyset cursors for the start of each page visited so far; reset when the page size changes
+    if st.session_state.get('history_cursor_page_size') != page_size:
+        st.session_state.history_cursors = [None]
+        st.session_state.history_cursor_page_size = page_size
+    cursors = st.session_state.history_cursors
+    
+    predictions, has_more = get_prediction_history_page(user_id, page_size, cursors[-1])
     
     if predictions:
-        st.write("### Your Recent Predictions")
+        st.write("### Your Predictions")
         for prediction in predictions:
             with st.expander(f"Prediction: {prediction['predicted_disease']} - {prediction['created_at'][:19]}"):
                 col1, col2 = st.columns([1, 2])
                 with col1:
+                    # Small precomputed thumbnail instead of the original upload
+                    show_thumbnail(prediction['image_sha256'])
                     st.write(f"**Disease:** {prediction['predicted_disease']}")
                     st.write(f"**Accuracy:** 95%")
                     st.write(f"**Date:** {prediction['created_at'][:19]}")
@@ -59,8 +80,127 @@ def show_user_dashboard():
                             save_feedback(user_id, prediction['id'], rating, feedback_text)
                             st.success("Feedback submitted successfully!")
                             st.rerun()
+        
+        # Page navigation
+        total_pages = max(1, -(-totals['prediction_count'] // page_size))
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if st.button("⬅️ Newer", disabled=len(cursors) == 1, key="history_prev"):
+                cursors.pop()
+                st.rerun()
+        with col2:
+            st.write(f"Page {len(cursors)} of {total_pages}")
+        with col3:
+            if st.button("Older ➡️", disabled=not has_more, key="history_next"):
+                last = predictions[-1]
+                cursors.append((last['created_at'], last['id']))
+                st.rerun()
     else:
         st.info("No predictions yet. Use the Disease Detection feature to get started!")
+    
+    # Predictions past the retention window live in the archive files
+    if list_archives():
+        with st.expander("🗄️ Archived Predictions"):
+            if st.button("Load archived predictions", key="load_archived_predictions"):
+                archived = get_archived_predictions(user_id)
+                if archived:
+                    archived_df = pd.DataFrame([
+                        {
+                            'Date': row['created_at'][:19],
+                            'Disease': row['predicted_disease'],
+                            'Your Rating': row['rating'] or "",
+                            'Your Feedback': row['comments'] or ""
+                        }
+                        for row in archived
+                    ])
+                    st.dataframe(archived_df, use_container_width=True, hide_index=True)
+                else:
+                    st.info("No archived predictions.")
+
+def show_thumbnail(image_sha256, caption=None):
+    """Show a stored image's thumbnail, encoded once and then served from the rendition cache"""
+    thumbnail_path = get_thumbnail_path(image_sha256) if image_sha256 else None
+    if thumbnail_path:
+        rendition = get_display_rendition(image_sha256, lambda: Image.open(thumbnail_path), *THUMBNAIL_SIZE)
+        st.image(rendition, caption=caption, width=160)
+
+def get_upload_sha256(uploaded_file):
+    """Hash the current upload once, reusing the hash on later reruns"""
+    upload_hashes = st.session_state.setdefault('upload_hashes', {})
+    if uploaded_file.file_id not in upload_hashes:
+        # Only the file currently in the uploader is worth remembering
+        upload_hashes.clear()
+        upload_hashes[uploaded_file.file_id] = hash_image_bytes(uploaded_file.getvalue())
+    return upload_hashes[uploaded_file.file_id]
+
+def get_archived_predictions(user_id):
+    """Get a user's predictions from the archive files, newest first"""
+    return query_archives('''
+        SELECT p.created_at, p.predicted_disease, f.rating, f.comments
+        FROM archive.predictions p
+        LEFT JOIN archive.feedback f ON p.id = f.prediction_id
+        WHERE p.user_id = ?
+        ORDER BY p.created_at DESC, p.id DESC
+    ''', (user_id,))
+
+def get_prediction_totals(user_id):
+    """Get a user's prediction count and latest prediction time"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    # Denormalized on the users row and kept current by triggers
+    cursor.execute('''
+        SELECT prediction_count, last_prediction_at AS last_prediction
+        FROM users
+        WHERE id = ?
+    ''', (user_id,))
+    
+    totals = cursor.fetchone()
+    conn.close()
+    
+    return totals or {'prediction_count': 0, 'last_prediction': None}
+
+def get_prediction_history_page(user_id, page_size, cursor_key=None):
+    """Get one page of a user's predictions, newest first
+    
+    cursor_key is the (created_at, id) of the last row on the previous page.
+    Returns the rows and whether an older page exists.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    keyset_filter = ""
+    params = [user_id]
+    if cursor_key is not None:
+        keyset_filter = "AND (created_at, id) < (?, ?)"
+        params.extend(cursor_key)
+    
+    # Page the predictions first so feedback rows cannot split a page
+    cursor.execute(f'''
+        SELECT p.*, f.rating, f.comments
+        FROM (
+            SELECT * FROM predictions
+            WHERE user_id = ? {keyset_filter}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        ) p
+        LEFT JOIN feedback f ON p.id = f.prediction_id
+        ORDER BY p.created_at DESC, p.id DESC
+    ''', (*params, page_size + 1))
+    
+    rows = cursor.fetchall()
+    conn.close()
+    
+    # The extra row only tells us whether another page follows
+    page_ids = []
+    for row in rows:
+        if row['id'] not in page_ids:
+            page_ids.append(row['id'])
+    has_more = len(page_ids) > page_size
+    if has_more:
+        rows = [row for row in rows if row['id'] != page_ids[-1]]
+    
+    return rows, has_more
 
 
 def show_disease_detection_interface():
@@ -82,13 +222,15 @@ def show_disease_detection_interface():
     )
     
     if uploaded_file is not None:
-        # Display uploaded image
+        # Display uploaded image (Image.open only reads the header until pixels are needed)
         image = Image.open(uploaded_file)
+        image_sha256 = get_upload_sha256(uploaded_file)
         
         col1, col2 = st.columns([1, 1])
         
         with col1:
-            st.image(image, caption="Uploaded Image", use_container_width=True)
+            # A cached, pre-encoded display copy instead of resending the full upload each rerun
+            st.image(get_display_rendition(image_sha256, lambda: image), caption="Uploaded Image", use_container_width=True)
         
         with col2:
             st.write("### Image Information")
@@ -96,38 +238,111 @@ def show_disease_detection_interface():
             st.write(f"**Size:** {image.size}")
             st.write(f"**Format:** {image.format}")
         
+        # Set by "Analyze Again" on a repeat upload; runs the model on this rerun only
+        reanalyze = st.session_state.pop('reanalyze_upload', False)
+        
         # Predict button
-        if st.button("🔍 Analyze Image", type="primary"):
+        if st.button("🔍 Analyze Image", type="primary") or reanalyze:
+            # Cheap quality gate so unusable photos never reach the model
+            quality = assess_image_quality(image)
+            if not quality['passed']:
+                for issue in quality['issues']:
+                    st.error(issue)
+                return
+            
+            for warning in quality['warnings']:
+                st.warning(warning)
+            
+            # Resolved once at login
+            user_id = st.session_state.identity['user_id']
+            
+            # The same picture again (resized or recompressed too) reuses the earlier result
+            image_hash = compute_image_hash(image)
+            duplicates = find_near_duplicates(user_id, image_hash)
+            earlier = duplicates[0][1] if duplicates else None
+            if earlier is not None and not reanalyze:
+                show_earlier_prediction(earlier)
+                return
+            
             with st.spinner("Analyzing image... Please wait."):
                 # Load model
                 model = load_model()
                 
-                # Preprocess image
-                processed_image = preprocess_image(image)
+                # Crop to the skin region so the model input carries more lesion pixels
+                roi_image = crop_to_skin_roi(image)
+                
+                # Resized once: fed to the model and kept in the image store
+                model_image = resize_for_model(roi_image)
                 
-                if processed_image is not None:
+                # The upload is stored once by content, with its thumbnail, while the model runs
+                store_future = _pipeline_executor.submit(store_image, uploaded_file.getvalue(), image, model_image, image_sha256)
+                
+                # Preprocess into a pooled input buffer
+                input_buffer = acquire_input_buffer()
+                try:
+                    processed_image = preprocess_image(model_image, out=input_buffer[0])
+                    
                     # Make prediction
-                    result = predict_disease(model, processed_image)
+                    result = predict_disease(model, processed_image) if processed_image is not None else None
+                finally:
+                    release_input_buffer(input_buffer)
+                
+                if result:
+                    predicted_disease = result['predicted_disease']
                     
-                    if result:
-                        # Save prediction to database
-                        user_id = get_user_id(st.session_state.username)
-                        prediction_id = save_prediction(
-                            user_id, 
-                            uploaded_file.name, 
-                            result['predicted_disease'], 
-                            0.95
-                        )
-                        
-                        # Display results
-                        display_prediction_results(result)
-                        
-                        # Show recommended doctors
-                        show_recommended_doctors(result['predicted_disease'])
-                        
-                        # Feedback section
-                        st.write("---")
-                        show_feedback_section(user_id, prediction_id)
+                    # Doctor lookup and prediction write only need the label
+                    doctors_future = _pipeline_executor.submit(get_recommended_doctors, predicted_disease)
+                    
+                    # Queued for the writer thread; resolves with the id once committed
+                    prediction_future = submit_write(
+                        insert_prediction,
+                        user_id,
+                        uploaded_file.name,
+                        predicted_disease,
+                        0.95,
+                        image_sha256,
+                        to_db_hash(image_hash),
+                        get_cluster_root(earlier) if earlier is not None else None
+                    )
+                    
+                    # Display results
+                    display_prediction_results(result)
+                    
+                    # Show recommended doctors
+                    show_recommended_doctors(predicted_disease, doctors_future.result())
+                    
+                    # The prediction is saved either way; only its thumbnail would be missing
+                    try:
+                        store_future.result()
+                    except Exception as e:
+                        st.warning(f"Could not keep a copy of the image: {e}")
+                    
+                    # Feedback section needs the saved prediction id
+                    st.write("---")
+                    show_feedback_section(user_id, prediction_future.result())
+
+def request_reanalysis():
+    """Button callback: analyze the current upload even though it repeats an earlier one"""
+    st.session_state.reanalyze_upload = True
+
+def show_earlier_prediction(prediction):
+    """Show the result of an earlier upload of the same picture instead of running the model again"""
+    st.info(f"You already analyzed this picture on {prediction['created_at'][:19]}. Showing that result.")
+    
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        show_thumbnail(prediction['image_sha256'], caption="Earlier upload")
+    
+    with col2:
+        st.write(f"### Primary Diagnosis: **{prediction['predicted_disease']}**")
+        disease_info = get_disease_info(prediction['predicted_disease'])
+        st.write(f"**Description:** {disease_info['description']}")
+        st.write(f"**Severity Level:** {disease_info['severity']}")
+        st.write(f"**Specialist Required:** {disease_info['specialist']}")
+    
+    st.button("🔁 Analyze Again", help="Run a new analysis of this upload", on_click=request_reanalysis)
+    
+    show_recommended_doctors(prediction['predicted_disease'])
 
 def display_prediction_results(result):
     """Display prediction results"""
@@ -191,33 +406,43 @@ def display_prediction_results(result):
         
         st.info("💡 These visual features help the AI analyze the skin condition based on color, texture, and other characteristics typical of different diseases.")
 
-def show_recommended_doctors(predicted_disease):
-    """Show recommended doctors based on predicted disease"""
-    st.write("## 👨‍⚕️ Recommended Specialists")
-    
+def get_recommended_doctors(predicted_disease):
+    """Get doctors for the predicted disease, served from the reference data cache"""
+    return cached_lookup('doctors', ('recommended', predicted_disease), lambda: load_recommended_doctors(predicted_disease))
+
+def load_recommended_doctors(predicted_disease):
+    """Query doctors for the predicted disease, falling back to dermatologists"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Get doctors who treat this condition
-    cursor.execute('''
-        SELECT * FROM doctors 
-        WHERE diseases_treated LIKE ? 
-        ORDER BY experience_years DESC
-    ''', (f'%{predicted_disease}%',))
+    # Ranked lists are precomputed per disease in doctor_diseases
+    query = '''
+        SELECT d.* FROM doctor_diseases dd
+        JOIN doctors d ON d.id = dd.doctor_id
+        WHERE dd.disease = ?
+        ORDER BY dd.rank
+    '''
     
+    # Get doctors who treat this condition
+    cursor.execute(query, (predicted_disease,))
     doctors = cursor.fetchall()
     
     if not doctors:
         # If no specific doctors found, get all dermatologists
-        cursor.execute('''
-            SELECT * FROM doctors 
-            WHERE specialization LIKE '%Dermatology%' 
-            ORDER BY experience_years DESC
-        ''')
+        cursor.execute(query, (GENERAL_DERMATOLOGY_KEY,))
         doctors = cursor.fetchall()
     
     conn.close()
     
+    return tuple(doctors)
+
+def show_recommended_doctors(predicted_disease, doctors=None):
+    """Show recommended doctors based on predicted disease"""
+    st.write("## 👨‍⚕️ Recommended Specialists")
+    
+    if doctors is None:
+        doctors = get_recommended_doctors(predicted_disease)
+    
     if doctors:
         for doctor in doctors:
             with st.expander(f"Dr. {doctor['name']} - {doctor['specialization']}"):
@@ -254,35 +479,34 @@ def show_feedback_section(user_id, prediction_id):
         else:
             st.error("Error saving feedback. Please try again.")
 
-def save_prediction(user_id, image_name, predicted_disease, confidence):
-    """Save prediction to database"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def insert_prediction(cursor, user_id, image_name, predicted_disease, confidence, image_sha256=None, image_phash=None, duplicate_of=None):
+    """Insert a prediction row (runs on the writer thread), returning its id"""
+    cursor.execute('''
+        INSERT INTO predictions (user_id, image_name, predicted_disease, confidence_score, image_sha256, image_phash, duplicate_of)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (user_id, image_name, predicted_disease, confidence, image_sha256, image_phash, duplicate_of))
     
+    return cursor.lastrowid
+
+def save_prediction(user_id, image_name, predicted_disease, confidence, image_sha256=None, image_phash=None, duplicate_of=None):
+    """Save prediction to database, waiting for the group commit"""
+    return execute_write(insert_prediction, user_id, image_name, predicted_disease, confidence, image_sha256, image_phash, duplicate_of)
+
+def insert_feedback(cursor, user_id, prediction_id, rating, comments):
+    """Insert a feedback row (runs on the writer thread)"""
     cursor.execute('''
-        INSERT INTO predictions (user_id, image_name, predicted_disease, confidence_score)
+        INSERT INTO feedback (user_id, prediction_id, rating, comments)
         VALUES (?, ?, ?, ?)
-    ''', (user_id, image_name, predicted_disease, confidence))
-    
-    prediction_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    ''', (user_id, prediction_id, rating, comments))
     
-    return prediction_id
+    # Keep the analytics rollup in step within the same transaction
+    record_feedback_rollup(cursor, prediction_id, rating)
 
 def save_feedback(user_id, prediction_id, rating, comments):
     """Save user feedback"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO feedback (user_id, prediction_id, rating, comments)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, prediction_id, rating, comments))
-        
-        conn.commit()
-        conn.close()
+        # Waits for the commit so the page can show the feedback straight after
+        execute_write(insert_feedback, user_id, prediction_id, rating, comments)
         return True
     except Exception as e:
         st.error(f"Error saving feedback: {str(e)}")
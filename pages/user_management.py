@@ -1,38 +1,69 @@
 import streamlit as st
-from database import get_db_connection, hash_password
+from database import get_db_connection, get_analytics_connection, get_summary_counters, delete_users, hash_password, bump_data_version
+from auth import invalidate_identity
+from utils.analytics import show_snapshot_status, refresh_after_write
 import pandas as pd
+import sqlite3
+from utils.pagination import count_rows, fetch_page, show_pagination_controls
+from utils.bulk_import import read_import_chunks, reject_rows, reject_missing, reject_duplicates, parse_flags, show_bulk_import_form, EMAIL_PATTERN
+
+# Sort choices for the user list (always tie-broken by id for stable pages)
+USER_SORT_OPTIONS = {
+    "Newest first": "u.created_at DESC, u.id DESC",
+    "Oldest first": "u.created_at ASC, u.id ASC",
+    "Username (A-Z)": "u.username ASC"
+}
+
+# Bulk import CSV layout
+USER_IMPORT_COLUMNS = ["username", "email", "password"]
+USER_IMPORT_OPTIONAL_COLUMNS = ["is_admin"]
 
 def show_user_management():
     """User management interface"""
     st.title("👥 User Management")
     
-    tab1, tab2 = st.tabs(["View Users", "Add User"])
+    tab1, tab2, tab3 = st.tabs(["View Users", "Add User", "Bulk Import"])
     
     with tab1:
         show_users_list()
     
     with tab2:
         show_add_user_form()
+    
+    with tab3:
+        st.subheader("Import Users from CSV")
+        show_bulk_import_form(
+            "users",
+            "Columns: **username**, **email**, **password**, is_admin (optional: yes/no). "
+            "Invalid or duplicate rows are skipped and listed below.",
+            import_users
+        )
 
 def show_users_list():
     """Display list of all users with management options"""
     st.subheader("Registered Users")
+    show_snapshot_status("users")
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    # Listing and totals read the reporting snapshot
+    conn = get_analytics_connection()
+    counters = get_summary_counters(conn=conn)
+    total_users = counters.get('users', 0)
     
-    cursor.execute('''
-        SELECT u.*, 
-               COUNT(p.id) as prediction_count,
-               MAX(p.created_at) as last_prediction
-        FROM users u
-        LEFT JOIN predictions p ON u.id = p.user_id
-        WHERE u.is_admin = 0
-        GROUP BY u.id
-        ORDER BY u.created_at DESC
-    ''')
+    col1, col2 = st.columns(2)
+    with col1:
+        search = st.text_input("Search username or email:", key="user_search")
+    with col2:
+        sort_label = st.selectbox("Sort by:", list(USER_SORT_OPTIONS), key="user_sort")
+    
+    filters = ["u.is_admin = 0"]
+    params = []
+    if search:
+        filters.append("u.username LIKE ? OR u.email LIKE ?")
+        params.extend([f"%{search}%", f"%{search}%"])
     
-    users = cursor.fetchall()
+    matching = count_rows("FROM users u", filters, params, conn=conn)
+    page, page_size = show_pagination_controls("users", matching)
+    users = fetch_page("u.*", "FROM users u", filters, params, USER_SORT_OPTIONS[sort_label], page, page_size, conn=conn)
     conn.close()
     
     if users:
@@ -44,8 +75,8 @@ def show_users_list():
                 'Username': user['username'],
                 'Email': user['email'],
                 'Joined': user['created_at'][:10],
-                'Predictions': user['prediction_count'] or 0,
-                'Last Active': user['last_prediction'][:10] if user['last_prediction'] else 'Never'
+                'Predictions': user['prediction_count'],
+                'Last Active': user['last_prediction_at'][:10] if user['last_prediction_at'] else 'Never'
             })
         
         df = pd.DataFrame(users_data)
@@ -56,15 +87,13 @@ def show_users_list():
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            st.metric("Total Users", len(users))
+            st.metric("Total Users", total_users)
         
         with col2:
-            active_users = sum(1 for user in users if user['prediction_count'] > 0)
-            st.metric("Active Users", active_users)
+            st.metric("Active Users", counters.get('active_users', 0))
         
         with col3:
-            total_predictions = sum(user['prediction_count'] or 0 for user in users)
-            st.metric("Total Predictions", total_predictions)
+            st.metric("Total Predictions", counters.get('predictions', 0))
         
         # User management actions
         st.write("---")
@@ -96,12 +125,28 @@ def show_users_list():
                     else:
                         st.session_state.confirm_delete_user = user_id
                         st.warning("Click again to confirm deletion")
+        
+        # Bulk delete from the current page
+        with st.expander("🗑️ Delete Several Users"):
+            selected_users = st.multiselect("Users to delete:", user_options, key="bulk_delete_users")
+            if selected_users and st.button(f"Delete {len(selected_users)} user(s) and all their data", key="bulk_delete_users_btn"):
+                user_ids = [int(option.split(" - ")[0]) for option in selected_users]
+                if st.session_state.get('confirm_bulk_delete_users') == user_ids:
+                    if delete_selected_users(user_ids):
+                        st.success(f"Deleted {len(user_ids)} user(s)")
+                        del st.session_state.confirm_bulk_delete_users
+                        st.rerun()
+                else:
+                    st.session_state.confirm_bulk_delete_users = user_ids
+                    st.warning("Click again to confirm deletion")
+    elif total_users:
+        st.info("No users match the search.")
     else:
         st.info("No users registered yet.")
 
 def show_user_details(user_id):
     """Show detailed information about a user"""
-    conn = get_db_connection()
+    conn = get_analytics_connection()
     cursor = conn.cursor()
     
     # Get user info
@@ -212,11 +257,57 @@ def add_user(username, email, password, is_admin=False):
         
         conn.commit()
         conn.close()
+        refresh_after_write()
         return True
     except Exception as e:
         st.error(f"Error adding user: {str(e)}")
         return False
 
+def import_users(source):
+    """Validate a users CSV and insert every valid row in one transaction
+    
+    Returns (imported_count, errors) with one error entry per rejected row.
+    """
+    errors = []
+    rows = []
+    seen_usernames = set()
+    seen_emails = set()
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        for chunk in read_import_chunks(source, USER_IMPORT_COLUMNS, USER_IMPORT_OPTIONAL_COLUMNS):
+            chunk = reject_missing(chunk, USER_IMPORT_COLUMNS, errors)
+            chunk = reject_rows(chunk, ~chunk['email'].str.match(EMAIL_PATTERN), "Invalid email", errors)
+            chunk = reject_duplicates(chunk, 'username', seen_usernames, cursor, 'users', errors)
+            chunk = reject_duplicates(chunk, 'email', seen_emails, cursor, 'users', errors)
+            
+            rows.extend(zip(
+                chunk['username'].tolist(),
+                chunk['email'].tolist(),
+                chunk['password'].map(hash_password).tolist(),
+                parse_flags(chunk['is_admin']).tolist()
+            ))
+    except ValueError as e:
+        conn.close()
+        return 0, [{'Row': None, 'Error': str(e)}]
+    
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor.executemany('''
+            INSERT INTO users (username, email, password_hash, is_admin)
+            VALUES (?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.close()
+        return 0, errors + [{'Row': None, 'Error': f"Import rolled back: {str(e)}"}]
+    
+    conn.close()
+    refresh_after_write()
+    return len(rows), sorted(errors, key=lambda error: error['Row'])
+
 def reset_user_password(user_id, new_password):
     """Reset user password"""
     try:
@@ -225,11 +316,14 @@ def reset_user_password(user_id, new_password):
         
         password_hash = hash_password(new_password)
         cursor.execute('''
-            UPDATE users SET password_hash = ? WHERE id = ?
+            UPDATE users SET password_hash = ?, credential_version = credential_version + 1 WHERE id = ?
         ''', (password_hash, user_id))
+        bump_data_version(cursor, 'users')
         
         conn.commit()
         conn.close()
+        invalidate_identity(user_id)
+        refresh_after_write()
         return True
     except Exception as e:
         st.error(f"Error resetting password: {str(e)}")
@@ -237,22 +331,16 @@ def reset_user_password(user_id, new_password):
 
 def delete_user(user_id):
     """Delete user and all associated data"""
+    return delete_selected_users([user_id])
+
+def delete_selected_users(user_ids):
+    """Delete users and their predictions and feedback (cascaded) in one transaction"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Delete associated feedback first
-        cursor.execute("DELETE FROM feedback WHERE user_id = ?", (user_id,))
-        
-        # Delete associated predictions
-        cursor.execute("DELETE FROM predictions WHERE user_id = ?", (user_id,))
-        
-        # Delete user
-        cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
-        
-        conn.commit()
-        conn.close()
+        delete_users(user_ids)
+        for user_id in user_ids:
+            invalidate_identity(user_id)
+        refresh_after_write()
         return True
     except Exception as e:
-        st.error(f"Error deleting user: {str(e)}")
+        st.error(f"Error deleting users: {str(e)}")
         return False
@@ -0,0 +1,41 @@
+import streamlit as st
+import time
+from database import get_snapshot_age, refresh_analytics_snapshot, refresh_snapshot_in_background, is_snapshot_refreshing, ANALYTICS_SNAPSHOT_ENABLED, ANALYTICS_REFRESH_INTERVAL
+
+def format_age(seconds):
+    """Format a snapshot age for display"""
+    if seconds < 60:
+        return "just now"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} min ago"
+    return f"{seconds / 3600:.1f} h ago"
+
+def show_snapshot_status(key):
+    """Show how old the reporting snapshot is, with a button to refresh it now"""
+    if not ANALYTICS_SNAPSHOT_ENABLED:
+        return
+    
+    age = get_snapshot_age()
+    col1, col2 = st.columns([4, 1])
+    
+    with col1:
+        if age is None:
+            st.caption("📸 Reporting snapshot not created yet")
+        elif is_snapshot_refreshing():
+            st.caption("📸 Reporting snapshot is being updated with recent changes; use Refresh data to see them now")
+        else:
+            taken_at = time.strftime('%H:%M:%S', time.localtime(time.time() - age))
+            st.caption(
+                f"📸 Figures are from a reporting snapshot taken at {taken_at} ({format_age(age)}); "
+                f"it refreshes every {ANALYTICS_REFRESH_INTERVAL // 60} min"
+            )
+    
+    with col2:
+        if st.button("🔄 Refresh data", key=f"{key}_refresh_snapshot"):
+            refresh_analytics_snapshot()
+            st.rerun()
+
+def refresh_after_write():
+    """Start a snapshot refresh after an admin change, off the admin's click path"""
+    if ANALYTICS_SNAPSHOT_ENABLED:
+        refresh_snapshot_in_background()
@@ -0,0 +1,230 @@
+import os
+import glob
+import time
+import database
+from database import open_connection
+
+# Archive files live in a folder next to the hot database, one per year of prediction dates
+ARCHIVE_DIR = "archives"
+ARCHIVE_FILE_PATTERN = "archive_{year}.sqlite"
+
+# Predictions older than this are moved out of the hot database
+RETENTION_DAYS = 365
+
+# Rows moved per transaction, and the pause between transactions, so
+# request threads and the writer queue get the write lock in between
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_BATCH_PAUSE = 0.05
+
+# Free pages returned to the filesystem per incremental vacuum step
+INCREMENTAL_VACUUM_PAGES = 1000
+
+# Rows sampled per index by ANALYZE; keeps it cheap on large tables
+ANALYSIS_LIMIT = 1000
+
+def get_archive_dir():
+    """Get the archive folder for the current database"""
+    return os.path.join(os.path.dirname(database.DATABASE_PATH), ARCHIVE_DIR)
+
+def get_archive_path(year):
+    """Get the archive file for a year of prediction dates"""
+    return os.path.join(get_archive_dir(), ARCHIVE_FILE_PATTERN.format(year=year))
+
+def list_archives():
+    """Get the archive files on disk, newest year first"""
+    return sorted(glob.glob(os.path.join(get_archive_dir(), ARCHIVE_FILE_PATTERN.format(year="*"))), reverse=True)
+
+def get_table_columns(conn, table, schema="main"):
+    """Get a table's column names and declared types"""
+    return [(row[1], row[2]) for row in conn.execute(f"PRAGMA {schema}.table_info({table})").fetchall()]
+
+def prepare_archive_table(conn, table):
+    """Create or extend archive.<table> so it has every column of the hot table"""
+    hot_columns = get_table_columns(conn, table)
+    definitions = ", ".join(
+        f"{name} {column_type} PRIMARY KEY" if name == "id" else f"{name} {column_type}"
+        for name, column_type in hot_columns
+    )
+    conn.execute(f"CREATE TABLE IF NOT EXISTS archive.{table} ({definitions})")
+    
+    # Columns added to the hot table after this archive was created
+    archived = {name for name, _ in get_table_columns(conn, table, "archive")}
+    for name, column_type in hot_columns:
+        if name not in archived:
+            conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {name} {column_type}")
+    
+    return ", ".join(name for name, _ in hot_columns)
+
+def record_archived_totals(conn, placeholders, ids):
+    """Add predictions about to be archived, and their feedback, to the archived_* tallies"""
+    conn.execute(f'''
+        INSERT INTO archived_prediction_counts (user_id, predicted_disease, prediction_count)
+        SELECT COALESCE(user_id, 0), COALESCE(predicted_disease, ''), COUNT(*)
+        FROM predictions WHERE id IN ({placeholders})
+        GROUP BY 1, 2
+        ON CONFLICT (user_id, predicted_disease) DO UPDATE SET
+            prediction_count = prediction_count + excluded.prediction_count
+    ''', ids)
+    conn.execute(f'''
+        INSERT INTO archived_feedback_rollup (day, predicted_disease, rating, feedback_count, rating_sum)
+        SELECT date(f.created_at), COALESCE(p.predicted_disease, ''), COALESCE(f.rating, 0), COUNT(*), COALESCE(SUM(f.rating), 0)
+        FROM feedback f
+        JOIN predictions p ON f.prediction_id = p.id
+        WHERE f.prediction_id IN ({placeholders})
+        GROUP BY 1, 2, 3
+        ON CONFLICT (day, predicted_disease, rating) DO UPDATE SET
+            feedback_count = feedback_count + excluded.feedback_count,
+            rating_sum = rating_sum + excluded.rating_sum
+    ''', ids)
+
+def archive_year(conn, year, cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move one year's predictions older than cutoff, with their feedback, into its archive file"""
+    os.makedirs(get_archive_dir(), exist_ok=True)
+    
+    # ATTACH cannot run inside a transaction
+    conn.execute("ATTACH DATABASE ? AS archive", (get_archive_path(year),))
+    moved = 0
+    
+    try:
+        prediction_columns = prepare_archive_table(conn, "predictions")
+        feedback_columns = prepare_archive_table(conn, "feedback")
+        conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_predictions_user ON predictions (user_id, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_feedback_prediction ON feedback (prediction_id)")
+        conn.commit()
+        
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [row[0] for row in conn.execute('''
+                    SELECT id FROM predictions
+                    WHERE created_at < ? AND strftime('%Y', created_at) = ?
+                    ORDER BY id
+                    LIMIT ?
+                ''', (cutoff, year, batch_size)).fetchall()]
+                
+                if not ids:
+                    conn.rollback()
+                    break
+                
+                placeholders = ", ".join("?" * len(ids))
+                # Across attached WAL databases the copy and the delete are not one atomic
+                # commit; OR IGNORE makes re-running after a crash harmless
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO archive.predictions ({prediction_columns})
+                    SELECT {prediction_columns} FROM predictions WHERE id IN ({placeholders})
+                ''', ids)
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO archive.feedback ({feedback_columns})
+                    SELECT {feedback_columns} FROM feedback WHERE prediction_id IN ({placeholders})
+                ''', ids)
+                
+                # Archived rows stay in the lifetime counters and rollup: tally
+                # them, then delete with the counter triggers guarded off
+                record_archived_totals(conn, placeholders, ids)
+                conn.execute("INSERT INTO trigger_guards (name) VALUES ('archive')")
+                # Feedback goes with its prediction through the cascade
+                conn.execute(f"DELETE FROM predictions WHERE id IN ({placeholders})", ids)
+                conn.execute("DELETE FROM trigger_guards WHERE name = 'archive'")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            
+            moved += len(ids)
+            time.sleep(ARCHIVE_BATCH_PAUSE)
+    finally:
+        conn.execute("DETACH DATABASE archive")
+    
+    return moved
+
+def reclaim_space(conn):
+    """Return freed pages to the filesystem in short steps and refresh planner statistics"""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        while free_pages > 0:
+            # Each row stepped frees a page, so the pragma has to be read to the end
+            conn.execute(f"PRAGMA incremental_vacuum({INCREMENTAL_VACUUM_PAGES})").fetchall()
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if remaining >= free_pages:
+                break
+            free_pages = remaining
+            time.sleep(ARCHIVE_BATCH_PAUSE)
+    
+    conn.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+    conn.execute("ANALYZE")
+    conn.commit()
+
+def run_retention(retention_days=RETENTION_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """Archive predictions older than retention_days, then reclaim space; returns rows moved per year"""
+    # A private connection keeps the ATTACH away from the pooled per-thread ones
+    conn = open_connection()
+    moved = {}
+    
+    try:
+        cutoff = conn.execute("SELECT datetime('now', ?)", (f"-{int(retention_days)} days",)).fetchone()[0]
+        years = [row[0] for row in conn.execute('''
+            SELECT DISTINCT strftime('%Y', created_at) FROM predictions
+            WHERE created_at < ? AND created_at IS NOT NULL
+            ORDER BY 1
+        ''', (cutoff,)).fetchall()]
+        
+        for year in years:
+            moved[year] = archive_year(conn, year, cutoff, batch_size)
+        
+        reclaim_space(conn)
+    finally:
+        conn.close_connection()
+    
+    return moved
+
+def enable_incremental_vacuum():
+    """Switch the hot database to incremental auto-vacuum
+    
+    Needs one full VACUUM, which holds the write lock while it copies the
+    database, so run it once at a quiet time rather than from the retention job.
+    """
+    conn = open_connection()
+    try:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    finally:
+        conn.close_connection()
+
+def query_archives(sql, params=()):
+    """Run a query against each archive in turn (attached as 'archive'), newest year first
+    
+    Archives are attached one at a time so the number of files is not
+    bounded by SQLite's attached database limit.
+    """
+    rows = []
+    conn = open_connection()
+    
+    try:
+        for path in list_archives():
+            conn.execute("ATTACH DATABASE ? AS archive", (path,))
+            try:
+                rows.extend(conn.execute(sql, tuple(params)).fetchall())
+            finally:
+                conn.execute("DETACH DATABASE archive")
+    finally:
+        conn.close_connection()
+    
+    return rows
+
+def get_archive_summary():
+    """Get the predictions and feedback rows held in each archive file"""
+    summary = []
+    for path in list_archives():
+        conn = open_connection(path)
+        try:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            summary.append({
+                'file': os.path.basename(path),
+                'predictions': conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] if 'predictions' in tables else 0,
+                'feedback': conn.execute("SELECT COUNT(*) FROM feedback").fetchone()[0] if 'feedback' in tables else 0,
+                'size_mb': os.path.getsize(path) / (1024 * 1024)
+            })
+        finally:
+            conn.close_connection()
+    return summary
@@ -0,0 +1,182 @@
+import os
+import glob
+import hashlib
+import sqlite3
+import threading
+import time
+from datetime import datetime
+import database
+from database import open_connection
+
+# Backup files live in a folder next to the database, newest BACKUP_KEEP are kept
+BACKUP_DIR = "backups"
+BACKUP_FILE_PATTERN = "backup_{timestamp}.sqlite"
+BACKUP_TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+BACKUP_KEEP = 7
+
+# Pages copied per backup step, and the pause between steps, so the copy
+# does not monopolize the disk while requests are being served
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_PAUSE = 0.005
+
+# The server process takes a backup once the newest one is older than this
+BACKUP_SCHEDULE_ENABLED = True
+BACKUP_INTERVAL = 24 * 3600
+BACKUP_SCHEDULE_CHECK = 600
+
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
+# One backup at a time per process; the scheduler thread is started once
+_backup_lock = threading.Lock()
+_scheduler_thread = None
+_scheduler_lock = threading.Lock()
+_last_backup = {}
+
+def get_backup_dir():
+    """Get the backup folder for the current database"""
+    return os.path.join(os.path.dirname(database.DATABASE_PATH), BACKUP_DIR)
+
+def list_backups():
+    """Get the backup files on disk, newest first"""
+    return sorted(glob.glob(os.path.join(get_backup_dir(), BACKUP_FILE_PATTERN.format(timestamp="*"))), reverse=True)
+
+def get_checksum_path(path):
+    """Get the sha256sum-style checksum file stored beside a backup"""
+    return f"{path}.sha256"
+
+def file_sha256(path):
+    """Hash a file in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as backup_file:
+        for chunk in iter(lambda: backup_file.read(CHECKSUM_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def verify_backup(path):
+    """Check a backup file against its stored checksum"""
+    checksum_path = get_checksum_path(path)
+    if not os.path.exists(checksum_path):
+        return False
+    
+    with open(checksum_path) as checksum_file:
+        expected = checksum_file.read().split()[0]
+    return file_sha256(path) == expected
+
+def rotate_backups(keep=BACKUP_KEEP):
+    """Delete all but the newest keep backups with their checksum files, returning the removed paths"""
+    removed = list_backups()[max(keep, 1):]
+    for path in removed:
+        for stale in (path, get_checksum_path(path)):
+            if os.path.exists(stale):
+                os.remove(stale)
+    return removed
+
+def run_backup(keep=BACKUP_KEEP, pages=BACKUP_PAGES_PER_STEP):
+    """Copy the live database into a new checksummed backup file with the online backup API
+    
+    The source holds one WAL read transaction for the whole copy: writers keep
+    committing, the copy stays at that point in time, and the backup does not
+    restart every time another connection writes. Returns timing and size stats.
+    """
+    os.makedirs(get_backup_dir(), exist_ok=True)
+    
+    with _backup_lock:
+        timestamp = datetime.now().strftime(BACKUP_TIMESTAMP_FORMAT)
+        backup_path = os.path.join(get_backup_dir(), BACKUP_FILE_PATTERN.format(timestamp=timestamp))
+        temp_path = f"{backup_path}.tmp"
+        steps = 0
+        
+        def pause_between_steps(status, remaining, total):
+            nonlocal steps
+            steps += 1
+            if remaining:
+                time.sleep(BACKUP_STEP_PAUSE)
+        
+        started = time.monotonic()
+        source = open_connection()
+        target = sqlite3.connect(temp_path)
+        try:
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            source.backup(target, pages=pages, progress=pause_between_steps)
+            source.rollback()
+            
+            # A single self-contained file that can be copied back in place to restore
+            target.execute("PRAGMA journal_mode=DELETE")
+            page_count = target.execute("PRAGMA page_count").fetchone()[0]
+            target.close()
+            
+            checksum = file_sha256(temp_path)
+            os.replace(temp_path, backup_path)
+            with open(get_checksum_path(backup_path), "w") as checksum_file:
+                checksum_file.write(f"{checksum}  {os.path.basename(backup_path)}\n")
+        except Exception:
+            target.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        finally:
+            source.close_connection()
+        
+        seconds = time.monotonic() - started
+        size_bytes = os.path.getsize(backup_path)
+        stats = {
+            'file': os.path.basename(backup_path),
+            'sha256': checksum,
+            'pages': page_count,
+            'steps': steps,
+            'bytes': size_bytes,
+            'seconds': seconds,
+            'mb_per_second': size_bytes / (1024 * 1024) / seconds if seconds else 0.0,
+            'rotated': len(rotate_backups(keep)),
+            'finished_at': time.time()
+        }
+        _last_backup.clear()
+        _last_backup.update(stats)
+        return stats
+
+def get_last_backup():
+    """Get the stats of the last backup taken by this process, if any"""
+    return dict(_last_backup)
+
+def get_newest_backup_age():
+    """Seconds since the newest backup file was written, or None if there is none"""
+    backups = list_backups()
+    return time.time() - os.path.getmtime(backups[0]) if backups else None
+
+def run_scheduler():
+    """Take a backup whenever the newest one on disk is older than BACKUP_INTERVAL"""
+    while True:
+        age = get_newest_backup_age()
+        if age is None or age >= BACKUP_INTERVAL:
+            try:
+                stats = run_backup()
+                print(f"Backup {stats['file']} written in {stats['seconds']:.2f}s ({stats['mb_per_second']:.1f} MB/s)")
+            except Exception as e:
+                print(f"Scheduled backup failed: {e}")
+        time.sleep(BACKUP_SCHEDULE_CHECK)
+
+def start_backup_scheduler():
+    """Start the scheduled backup thread once per process"""
+    global _scheduler_thread
+    
+    if not BACKUP_SCHEDULE_ENABLED:
+        return
+    
+    with _scheduler_lock:
+        if _scheduler_thread is None or not _scheduler_thread.is_alive():
+            _scheduler_thread = threading.Thread(target=run_scheduler, name="db-backup", daemon=True)
+            _scheduler_thread.start()
+
+def get_backup_summary():
+    """Get the backup files on disk with their size and age (checksums are not re-verified here)"""
+    summary = []
+    for path in list_backups():
+        modified = os.path.getmtime(path)
+        summary.append({
+            'file': os.path.basename(path),
+            'created_at': datetime.fromtimestamp(modified).strftime("%Y-%m-%d %H:%M:%S"),
+            'size_mb': os.path.getsize(path) / (1024 * 1024),
+            'has_checksum': os.path.exists(get_checksum_path(path))
+        })
+    return summary
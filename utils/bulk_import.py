@@ -0,0 +1,104 @@
+import streamlit as st
+import pandas as pd
+
+# Rows validated per pandas pass; keeps memory flat for large files
+IMPORT_CHUNK_SIZE = 5000
+
+# Placeholders per IN (...) lookup, well under SQLite's variable limit
+LOOKUP_BATCH_SIZE = 500
+
+EMAIL_PATTERN = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+TRUE_VALUES = ["1", "true", "yes", "y"]
+
+def read_import_chunks(source, required_columns, optional_columns=(), chunk_size=IMPORT_CHUNK_SIZE):
+    """Stream a CSV as string DataFrame chunks with a 'row' column holding the file line number
+    
+    Raises ValueError if a required column is missing.
+    """
+    reader = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_size)
+    
+    for chunk in reader:
+        chunk.columns = chunk.columns.str.strip().str.lower()
+        missing = [column for column in required_columns if column not in chunk.columns]
+        if missing:
+            raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+        
+        for column in optional_columns:
+            if column not in chunk.columns:
+                chunk[column] = ""
+        
+        chunk = chunk[list(required_columns) + list(optional_columns)].apply(lambda column: column.str.strip())
+        # Line 1 is the header
+        chunk.insert(0, 'row', chunk.index + 2)
+        yield chunk
+
+def reject_rows(chunk, mask, message, errors):
+    """Record message for every row where mask is true and return the remaining rows"""
+    if mask.any():
+        errors.extend({'Row': row, 'Error': message} for row in chunk.loc[mask, 'row'])
+    return chunk[~mask]
+
+def reject_missing(chunk, columns, errors):
+    """Drop rows with an empty value in any of the given columns"""
+    for column in columns:
+        chunk = reject_rows(chunk, chunk[column] == "", f"Missing {column}", errors)
+    return chunk
+
+def fetch_existing_values(cursor, table, column, values):
+    """Get which of values already exist in table.column"""
+    values = list(values)
+    existing = set()
+    
+    for start in range(0, len(values), LOOKUP_BATCH_SIZE):
+        batch = values[start:start + LOOKUP_BATCH_SIZE]
+        placeholders = ", ".join("?" * len(batch))
+        cursor.execute(f"SELECT {column} FROM {table} WHERE {column} IN ({placeholders})", batch)
+        existing.update(row[0] for row in cursor.fetchall())
+    
+    return existing
+
+def reject_duplicates(chunk, column, seen, cursor, table, errors):
+    """Drop rows whose value repeats an earlier row or an existing database row, recording it in seen"""
+    existing = fetch_existing_values(cursor, table, column, chunk[column].unique())
+    mask = chunk[column].duplicated() | chunk[column].isin(seen) | chunk[column].isin(existing)
+    
+    if mask.any():
+        errors.extend(
+            {'Row': row, 'Error': f"Duplicate {column} '{value}'"}
+            for row, value in zip(chunk.loc[mask, 'row'], chunk.loc[mask, column])
+        )
+    chunk = chunk[~mask]
+    
+    seen.update(chunk[column])
+    return chunk
+
+def parse_flags(series):
+    """Vectorized yes/no parsing for CSV flag columns"""
+    return series.str.lower().isin(TRUE_VALUES)
+
+def show_bulk_import_form(key, columns_help, import_rows):
+    """Show a CSV upload and import button; import_rows(file) returns (imported_count, errors)"""
+    st.write(columns_help)
+    
+    uploaded_file = st.file_uploader("Choose a CSV file", type=["csv"], key=f"{key}_import_file")
+    
+    if uploaded_file is not None and st.button("📥 Import", key=f"{key}_import_btn", type="primary"):
+        with st.spinner("Importing..."):
+            imported, errors = import_rows(uploaded_file)
+        
+        if imported:
+            st.success(f"Imported {imported} row(s)")
+        
+        if errors:
+            st.error(f"{len(errors)} row(s) were not imported")
+            errors_df = pd.DataFrame(errors)
+            st.dataframe(errors_df, use_container_width=True, hide_index=True)
+            st.download_button(
+                label="Download error report",
+                data=errors_df.to_csv(index=False),
+                file_name=f"{key}_import_errors.csv",
+                mime="text/csv",
+                key=f"{key}_import_errors"
+            )
+        elif not imported:
+            st.info("The file has no rows to import.")
@@ -0,0 +1,71 @@
+import threading
+import time
+from database import get_data_version
+
+# How long a version read is trusted before asking the database again.
+# Writes in this process invalidate immediately; this only bounds how long
+# a change made by another process (e.g. manage.py) can go unnoticed.
+VERSION_CHECK_INTERVAL = 5
+
+# Process-wide, shared by every session: (dataset, key) -> (version, value)
+_cache_entries = {}
+_known_versions = {}
+_cache_stats = {}
+_cache_lock = threading.Lock()
+
+def _get_stats(dataset):
+    """Get (creating if needed) the hit/miss counters for a dataset"""
+    return _cache_stats.setdefault(dataset, {'hits': 0, 'misses': 0, 'invalidations': 0})
+
+def get_cached_version(dataset):
+    """Get the dataset version, re-reading it from the database at most every few seconds"""
+    now = time.monotonic()
+    known = _known_versions.get(dataset)
+    if known and now - known[1] < VERSION_CHECK_INTERVAL:
+        return known[0]
+    
+    version = get_data_version(dataset)
+    _known_versions[dataset] = (version, now)
+    return version
+
+def cached_lookup(dataset, key, loader):
+    """Return loader() for (dataset, key), reusing the stored value while the dataset version is unchanged
+    
+    loader should return an immutable value (tuples, sqlite3.Row) since it is shared across sessions.
+    """
+    version = get_cached_version(dataset)
+    
+    with _cache_lock:
+        entry = _cache_entries.get((dataset, key))
+        if entry and entry[0] == version:
+            _get_stats(dataset)['hits'] += 1
+            return entry[1]
+        _get_stats(dataset)['misses'] += 1
+    
+    value = loader()
+    
+    with _cache_lock:
+        _cache_entries[(dataset, key)] = (version, value)
+    
+    return value
+
+def invalidate_cache(dataset):
+    """Drop cached values for a dataset after its version was bumped and committed"""
+    with _cache_lock:
+        _known_versions.pop(dataset, None)
+        for cache_key in [cache_key for cache_key in _cache_entries if cache_key[0] == dataset]:
+            del _cache_entries[cache_key]
+        _get_stats(dataset)['invalidations'] += 1
+
+def get_cache_stats():
+    """Get hit/miss counters and entry counts per dataset"""
+    with _cache_lock:
+        stats = {}
+        for dataset, counters in _cache_stats.items():
+            lookups = counters['hits'] + counters['misses']
+            stats[dataset] = {
+                **counters,
+                'entries': sum(1 for cache_key in _cache_entries if cache_key[0] == dataset),
+                'hit_rate': counters['hits'] / lookups if lookups else 0.0
+            }
+        return stats
@@ -0,0 +1,156 @@
+import csv
+import os
+import tempfile
+import time
+from database import get_analytics_connection
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Parquet export is optional; CSV always works
+    pa = None
+    pq = None
+
+# Rows pulled from the cursor per step; bounds memory regardless of export size
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_FILE_PREFIX = "skin_disease_export_"
+EXPORT_MAX_AGE_SECONDS = 3600
+
+# Export definitions: query plus (column name, type) pairs
+EXPORT_DATASETS = {
+    "feedback": {
+        "query": '''
+            SELECT f.id, u.username, p.predicted_disease, p.confidence_score, f.rating, f.comments, f.created_at
+            FROM feedback f
+            JOIN users u ON f.user_id = u.id
+            JOIN predictions p ON f.prediction_id = p.id
+            ORDER BY f.created_at DESC, f.id DESC
+        ''',
+        "columns": [
+            ("Feedback ID", "int"),
+            ("Username", "string"),
+            ("Predicted Disease", "string"),
+            ("Model Confidence", "float"),
+            ("User Rating", "int"),
+            ("Comments", "string"),
+            ("Date", "timestamp")
+        ]
+    },
+    "predictions": {
+        "query": '''
+            SELECT p.id, u.username, p.image_name, p.predicted_disease, p.confidence_score, p.created_at
+            FROM predictions p
+            LEFT JOIN users u ON p.user_id = u.id
+            ORDER BY p.created_at DESC, p.id DESC
+        ''',
+        "columns": [
+            ("Prediction ID", "int"),
+            ("Username", "string"),
+            ("Image Name", "string"),
+            ("Predicted Disease", "string"),
+            ("Model Confidence", "float"),
+            ("Date", "timestamp")
+        ]
+    }
+}
+
+def parquet_available():
+    """Check whether the optional pyarrow dependency is installed"""
+    return pq is not None
+
+def iter_query_chunks(query, params=(), chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of rows from a query, chunk_size rows at a time (read from the reporting snapshot)"""
+    conn = get_analytics_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(query, tuple(params))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+def write_csv(dataset, path, chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream a dataset into a CSV file, returning the row count"""
+    definition = EXPORT_DATASETS[dataset]
+    row_count = 0
+    
+    with open(path, "w", newline="", encoding="utf-8") as export_file:
+        writer = csv.writer(export_file)
+        writer.writerow([name for name, _ in definition["columns"]])
+        for rows in iter_query_chunks(definition["query"], chunk_size=chunk_size):
+            writer.writerows(tuple(row) for row in rows)
+            row_count += len(rows)
+    
+    return row_count
+
+def get_parquet_schema(columns):
+    """Build the typed Arrow schema for an export"""
+    arrow_types = {
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "string": pa.string(),
+        "timestamp": pa.timestamp("s")
+    }
+    return pa.schema([(name, arrow_types[kind]) for name, kind in columns])
+
+def write_parquet(dataset, path, chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream a dataset into a Parquet file one row group per chunk, returning the row count"""
+    if not parquet_available():
+        raise RuntimeError("Parquet export requires the pyarrow package")
+    
+    definition = EXPORT_DATASETS[dataset]
+    schema = get_parquet_schema(definition["columns"])
+    row_count = 0
+    
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in iter_query_chunks(definition["query"], chunk_size=chunk_size):
+            arrays = []
+            for index, field in enumerate(schema):
+                values = [row[index] for row in rows]
+                if pa.types.is_timestamp(field.type):
+                    # created_at is stored as 'YYYY-MM-DD HH:MM:SS' text
+                    arrays.append(pa.array(values, pa.string()).cast(field.type))
+                else:
+                    arrays.append(pa.array(values, field.type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            row_count += len(rows)
+    
+    return row_count
+
+def cleanup_old_exports(max_age=EXPORT_MAX_AGE_SECONDS):
+    """Remove export files left in the temp directory by earlier sessions"""
+    temp_dir = tempfile.gettempdir()
+    cutoff = time.time() - max_age
+    
+    for name in os.listdir(temp_dir):
+        if not name.startswith(EXPORT_FILE_PREFIX):
+            continue
+        path = os.path.join(temp_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+def create_export_file(dataset, file_format="csv", chunk_size=EXPORT_CHUNK_SIZE):
+    """Write a dataset export to a temp file, returning (path, row_count)"""
+    cleanup_old_exports()
+    
+    fd, path = tempfile.mkstemp(prefix=f"{EXPORT_FILE_PREFIX}{dataset}_", suffix=f".{file_format}")
+    os.close(fd)
+    
+    try:
+        if file_format == "parquet":
+            row_count = write_parquet(dataset, path, chunk_size)
+        else:
+            row_count = write_csv(dataset, path, chunk_size)
+    except Exception:
+        os.remove(path)
+        raise
+    
+    return path, row_count
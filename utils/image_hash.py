@@ -0,0 +1,229 @@
+import os
+import threading
+from itertools import combinations
+import cv2
+import numpy as np
+from PIL import Image
+import database
+from database import get_db_connection, bump_data_version, chunk_ids
+from utils.cache import get_cached_version, invalidate_cache
+from utils.image_store import get_blob_path
+
+# Images within this many differing bits (of 64) count as the same picture,
+# e.g. a resized or recompressed copy of an earlier upload
+NEAR_DUPLICATE_DISTANCE = 6
+
+# pHash: DCT of a 32x32 grayscale copy, keeping the 8x8 lowest frequencies
+PHASH_IMAGE_SIDE = 32
+PHASH_BITS_SIDE = 8
+
+HASH_MASK = (1 << 64) - 1
+
+# The lookup index splits each hash into this many equal bands
+HASH_BANDS = 4
+HASH_BAND_BITS = 64 // HASH_BANDS
+HASH_BAND_MASK = (1 << HASH_BAND_BITS) - 1
+HASH_BACKFILL_BATCH_SIZE = 500
+
+# Process-wide index over predictions.image_phash, extended by prediction id
+# and rebuilt when the 'image_hashes' data version changes (e.g. after a backfill)
+_hash_index = None
+_hash_index_lock = threading.Lock()
+
+def compute_image_hash(image):
+    """Get the 64-bit perceptual hash (pHash) of a PIL image as an unsigned int"""
+    gray = np.asarray(image.convert('L').resize((PHASH_IMAGE_SIDE, PHASH_IMAGE_SIDE), Image.LANCZOS), dtype=np.float32)
+    low_frequencies = cv2.dct(gray)[:PHASH_BITS_SIDE, :PHASH_BITS_SIDE].flatten()
+    
+    # The DC term is the mean brightness and would skew the median
+    bits = low_frequencies > np.median(low_frequencies[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def to_db_hash(image_hash):
+    """Store an unsigned 64-bit hash in SQLite's signed INTEGER"""
+    return image_hash - (1 << 64) if image_hash >= (1 << 63) else image_hash
+
+def from_db_hash(value):
+    """Read a hash stored by to_db_hash back as unsigned"""
+    return value & HASH_MASK
+
+def hamming_distance(first, second):
+    """Count the differing bits of two hashes"""
+    return (first ^ second).bit_count()
+
+def get_band(image_hash, band):
+    """Get one HASH_BAND_BITS-wide slice of a hash"""
+    return (image_hash >> (band * HASH_BAND_BITS)) & HASH_BAND_MASK
+
+def get_band_neighbours(key, radius):
+    """Get every band value within radius bits of key, key included"""
+    neighbours = [key]
+    for bits in range(1, radius + 1):
+        for flipped in combinations(range(HASH_BAND_BITS), bits):
+            neighbours.append(key ^ sum(1 << bit for bit in flipped))
+    return neighbours
+
+class MultiIndexHashTable:
+    """Multi-index hash table over 64-bit hashes for Hamming-radius lookups
+    
+    Each hash is split into HASH_BANDS bands with a dict per band. Two hashes
+    within max_distance differ in at most max_distance // HASH_BANDS bits on
+    some band, so probing every band's keys that close finds all matches
+    while only touching a few buckets.
+    """
+    
+    def __init__(self):
+        self.tables = [{} for _ in range(HASH_BANDS)]
+        self.hashes = {}
+    
+    def __len__(self):
+        return len(self.hashes)
+    
+    def add(self, image_hash, item):
+        """Index item (a prediction id) under image_hash"""
+        self.hashes[item] = image_hash
+        for band, table in enumerate(self.tables):
+            table.setdefault(get_band(image_hash, band), []).append(item)
+    
+    def search(self, image_hash, max_distance):
+        """Get (distance, item) for every item within max_distance of image_hash"""
+        radius = max_distance // HASH_BANDS
+        candidates = set()
+        
+        for band, table in enumerate(self.tables):
+            for key in get_band_neighbours(get_band(image_hash, band), radius):
+                candidates.update(table.get(key, ()))
+        
+        matches = []
+        for item in candidates:
+            distance = hamming_distance(image_hash, self.hashes[item])
+            if distance <= max_distance:
+                matches.append((distance, item))
+        return matches
+
+def get_hash_index(conn):
+    """Get the process-wide hash index, bringing it up to date with committed predictions"""
+    global _hash_index
+    
+    version = get_cached_version("image_hashes")
+    
+    with _hash_index_lock:
+        index = _hash_index
+        if index is None or index['version'] != version or index['path'] != database.DATABASE_PATH:
+            index = {'table': MultiIndexHashTable(), 'last_id': 0, 'version': version, 'path': database.DATABASE_PATH}
+        
+        # Prediction ids only grow, so new rows are the ones past the last indexed id
+        rows = conn.execute('''
+            SELECT id, image_phash FROM predictions
+            WHERE id > ? AND image_phash IS NOT NULL
+            ORDER BY id
+        ''', (index['last_id'],)).fetchall()
+        for prediction_id, image_phash in rows:
+            index['table'].add(from_db_hash(image_phash), prediction_id)
+        if rows:
+            index['last_id'] = rows[-1][0]
+        
+        _hash_index = index
+        return index['table']
+
+def find_near_duplicates(user_id, image_hash, max_distance=NEAR_DUPLICATE_DISTANCE, conn=None):
+    """Get a user's earlier predictions of the same picture, closest and newest first
+    
+    The index may still hold deleted or archived predictions; they drop out
+    when the candidates are read back, as do other users' predictions.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    
+    try:
+        matches = get_hash_index(conn).search(image_hash, max_distance)
+        if not matches:
+            return []
+        
+        distances = {prediction_id: distance for distance, prediction_id in matches}
+        rows = []
+        for batch in chunk_ids(distances):
+            placeholders = ", ".join("?" * len(batch))
+            rows.extend(conn.execute(f'''
+                SELECT id, predicted_disease, confidence_score, created_at, image_sha256, duplicate_of
+                FROM predictions
+                WHERE user_id = ? AND id IN ({placeholders})
+            ''', (user_id, *batch)).fetchall())
+    finally:
+        if own_conn:
+            conn.close()
+    
+    # Closest first; among equally close matches the newest
+    rows.sort(key=lambda row: row['created_at'] or "", reverse=True)
+    rows.sort(key=lambda row: distances[row['id']])
+    return [(distances[row['id']], row) for row in rows]
+
+def get_cluster_root(prediction):
+    """Get the prediction id a duplicate should point at (the first upload of the picture)"""
+    return prediction['duplicate_of'] or prediction['id']
+
+def backfill_image_hashes(batch_size=HASH_BACKFILL_BATCH_SIZE, max_distance=NEAR_DUPLICATE_DISTANCE):
+    """Hash stored images of predictions that have none, then link each user's repeat uploads
+    
+    Returns (predictions hashed, predictions linked as duplicates).
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    hashed = 0
+    linked = 0
+    
+    try:
+        cursor.execute('''
+            SELECT id, image_sha256 FROM predictions
+            WHERE image_phash IS NULL AND image_sha256 IS NOT NULL
+            ORDER BY id
+        ''')
+        pending = cursor.fetchall()
+        
+        for start in range(0, len(pending), batch_size):
+            updates = []
+            for prediction_id, image_sha256 in pending[start:start + batch_size]:
+                path = get_blob_path(image_sha256)
+                if os.path.exists(path):
+                    with Image.open(path) as image:
+                        updates.append((to_db_hash(compute_image_hash(image)), prediction_id))
+            
+            conn.execute("BEGIN IMMEDIATE")
+            cursor.executemany("UPDATE predictions SET image_phash = ? WHERE id = ?", updates)
+            conn.commit()
+            hashed += len(updates)
+        
+        # Oldest first, so each repeat upload points at the first one of its picture
+        cursor.execute('''
+            SELECT id, user_id, image_phash, duplicate_of FROM predictions
+            WHERE image_phash IS NOT NULL
+            ORDER BY id
+        ''')
+        user_tables = {}
+        roots = {}
+        links = []
+        for row in cursor.fetchall():
+            table = user_tables.setdefault(row['user_id'], MultiIndexHashTable())
+            image_hash = from_db_hash(row['image_phash'])
+            root = row['duplicate_of']
+            if root is None:
+                matches = table.search(image_hash, max_distance)
+                if matches:
+                    # Point at the first upload of the closest earlier picture
+                    closest = min(matches)[1]
+                    root = roots.get(closest, closest)
+                    links.append((root, row['id']))
+            roots[row['id']] = root or row['id']
+            table.add(image_hash, row['id'])
+        
+        conn.execute("BEGIN IMMEDIATE")
+        cursor.executemany("UPDATE predictions SET duplicate_of = ? WHERE id = ?", links)
+        bump_data_version(cursor, "image_hashes")
+        conn.commit()
+        linked = len(links)
+    finally:
+        conn.close()
+    
+    invalidate_cache("image_hashes")
+    return hashed, linked
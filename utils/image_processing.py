@@ -1,16 +1,77 @@
+import threading
+from contextlib import contextmanager
 import cv2
 import numpy as np
 from PIL import Image, ImageEnhance, ImageFilter
 import streamlit as st
 
-def enhance_image_quality(image):
-    """Enhance image quality for better model prediction"""
+# Quality gate settings. The gate works on a pyramid level close to the model
+# input size, so thresholds are tuned for that scale rather than full resolution.
+QUALITY_GATE_MAX_SIDE = 256
+GATE_MIN_BRIGHTNESS = 15
+GATE_MAX_BRIGHTNESS = 240
+GATE_MIN_CONTRAST = 8
+GATE_MIN_SHARPNESS = 15
+
+# Softer limits at the same scale that pass the image with a suggestion. Mean
+# and spread barely change with downsampling; Laplacian variance drops sharply.
+GATE_WARN_MIN_BRIGHTNESS = 50
+GATE_WARN_MAX_BRIGHTNESS = 200
+GATE_WARN_CONTRAST = 25
+GATE_WARN_SHARPNESS = 40
+GATE_WARN_MIN_SIDE = 300
+
+# Skin ROI settings: mask resolution, margin around the box (fraction of box size),
+# and the smallest region worth cropping to (fraction of the image area)
+ROI_WORK_SIDE = 256
+ROI_MARGIN = 0.1
+ROI_MIN_AREA_RATIO = 0.02
+ROI_MAX_AREA_RATIO = 0.9
+
+# Fast enhancement works at twice the 224px model input instead of the upload resolution
+ENHANCE_WORKING_SIDE = 448
+ENHANCE_DENOISE_DIAMETER = 9
+
+# OpenCV threads for enhancement calls; None leaves OpenCV's own setting alone.
+# The setting is process-wide, so it only applies for the duration of a call.
+ENHANCE_THREADS = None
+
+# Calls that change the OpenCV thread count run one at a time
+_opencv_threads_lock = threading.Lock()
+
+@contextmanager
+def opencv_threads(threads):
+    """Run a block with OpenCV using threads worker threads, restoring the previous count after"""
+    if threads is None:
+        yield
+        return
+    
+    with _opencv_threads_lock:
+        previous = cv2.getNumThreads()
+        cv2.setNumThreads(threads)
+        try:
+            yield
+        finally:
+            cv2.setNumThreads(previous)
+
+def enhance_image_quality(image, fast=False, working_side=ENHANCE_WORKING_SIDE, threads=ENHANCE_THREADS):
+    """Enhance image quality for better model prediction
+    
+    With fast=True the enhancements run at working_side instead of the upload
+    resolution and the result stays at that size, which is meant for the model
+    input rather than for display. threads sets the OpenCV thread count for
+    this call only (e.g. os.cpu_count()).
+    """
     try:
         # Convert PIL image to numpy array
         img_array = np.array(image)
         
-        # Apply various enhancement techniques
-        enhanced_image = apply_image_enhancements(img_array)
+        with opencv_threads(threads):
+            if fast:
+                enhanced_image = apply_fast_enhancements(img_array, working_side)
+            else:
+                # Apply various enhancement techniques
+                enhanced_image = apply_image_enhancements(img_array)
         
         # Convert back to PIL Image
         return Image.fromarray(enhanced_image)
@@ -19,7 +80,11 @@ def enhance_image_quality(image):
         st.error(f"Error enhancing image: {str(e)}")
         return image
 
-def apply_image_enhancements(img_array):
+def use_opencl():
+    """Check whether OpenCV can run the enhancement filters on UMat"""
+    return cv2.ocl.haveOpenCL() and cv2.ocl.useOpenCL()
+
+def apply_image_enhancements(img_array, denoise_diameter=ENHANCE_DENOISE_DIAMETER, sharpen_amount=1.0, use_umat=False):
     """Apply various image enhancement techniques"""
     # Convert to BGR for OpenCV processing
     if len(img_array.shape) == 3 and img_array.shape[2] == 3:
@@ -27,8 +92,14 @@ def apply_image_enhancements(img_array):
     else:
         img_bgr = img_array
     
+    if use_umat:
+        img_bgr = cv2.UMat(img_bgr)
+    
     # 1. Noise reduction
-    denoised = cv2.bilateralFilter(img_bgr, 9, 75, 75)
+    if denoise_diameter > 1:
+        denoised = cv2.bilateralFilter(img_bgr, denoise_diameter, 75, 75)
+    else:
+        denoised = img_bgr
     
     # 2. Contrast enhancement using CLAHE
     lab = cv2.cvtColor(denoised, cv2.COLOR_BGR2LAB)
@@ -40,16 +111,30 @@ def apply_image_enhancements(img_array):
     enhanced = cv2.merge([l, a, b])
     enhanced = cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
     
-    # 3. Sharpening
-    kernel = np.array([[-1,-1,-1],
-                      [-1, 9,-1],
-                      [-1,-1,-1]])
+    # 3. Sharpening (amount 1.0 is the classic [-1 ... 9 ... -1] kernel)
+    kernel = np.full((3, 3), -sharpen_amount, dtype=np.float32)
+    kernel[1, 1] = 1 + 8 * sharpen_amount
     sharpened = cv2.filter2D(enhanced, -1, kernel)
     
     # Convert back to RGB
     result = cv2.cvtColor(sharpened, cv2.COLOR_BGR2RGB)
     
-    return result
+    return result.get() if use_umat else result
+
+def apply_fast_enhancements(img_array, working_side=ENHANCE_WORKING_SIDE):
+    """Run the enhancements at working resolution, returning the working-size result"""
+    height, width = img_array.shape[:2]
+    scale = min(working_side / max(width, height), 1.0)
+    
+    if scale == 1.0:
+        return apply_image_enhancements(img_array, use_umat=use_opencl())
+    
+    small = cv2.resize(img_array, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    
+    # Pixel-scale filters shrink with the image so they act on the same physical
+    # area; a full-size sharpen seen at this size is correspondingly weaker
+    diameter = int(round(ENHANCE_DENOISE_DIAMETER * scale)) | 1
+    return apply_image_enhancements(small, diameter, sharpen_amount=scale, use_umat=use_opencl())
 
 def validate_image(image):
     """Validate uploaded image for skin disease detection"""
@@ -98,26 +183,32 @@ def resize_image_for_display(image, max_width=800, max_height=600):
         st.error(f"Error resizing image: {str(e)}")
         return image
 
+def get_skin_mask(img_array):
+    """Build a cleaned-up HSV skin mask for an RGB array"""
+    # Convert to HSV color space
+    hsv = cv2.cvtColor(img_array, cv2.COLOR_RGB2HSV)
+    
+    # Define skin color range in HSV
+    lower_skin = np.array([0, 20, 70], dtype=np.uint8)
+    upper_skin = np.array([20, 255, 255], dtype=np.uint8)
+    
+    # Create mask for skin pixels
+    mask = cv2.inRange(hsv, lower_skin, upper_skin)
+    
+    # Apply morphological operations to clean up the mask
+    kernel = np.ones((3,3), np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+    
+    return mask
+
 def extract_skin_region(image):
     """Extract skin region from image using color-based segmentation"""
     try:
         # Convert to numpy array
         img_array = np.array(image)
         
-        # Convert to HSV color space
-        hsv = cv2.cvtColor(img_array, cv2.COLOR_RGB2HSV)
-        
-        # Define skin color range in HSV
-        lower_skin = np.array([0, 20, 70], dtype=np.uint8)
-        upper_skin = np.array([20, 255, 255], dtype=np.uint8)
-        
-        # Create mask for skin pixels
-        mask = cv2.inRange(hsv, lower_skin, upper_skin)
-        
-        # Apply morphological operations to clean up the mask
-        kernel = np.ones((3,3), np.uint8)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+        mask = get_skin_mask(img_array)
         
         # Apply mask to original image
         result = cv2.bitwise_and(img_array, img_array, mask=mask)
@@ -128,6 +219,50 @@ def extract_skin_region(image):
         st.error(f"Error extracting skin region: {str(e)}")
         return image
 
+def find_skin_roi(image, work_side=ROI_WORK_SIDE, margin=ROI_MARGIN):
+    """Find the box around the dominant skin region in full-resolution coordinates"""
+    try:
+        width, height = image.size
+        factor = get_pyramid_factor(width, height, work_side)
+        
+        rgb = image if image.mode == 'RGB' else image.convert('RGB')
+        small = np.array(rgb.reduce(factor) if factor > 1 else rgb)
+        
+        mask = get_skin_mask(small)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        if count < 2:
+            return None
+        
+        # Label 0 is the background, keep the largest foreground component
+        label = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+        x, y, w, h, area = stats[label]
+        
+        small_area = small.shape[0] * small.shape[1]
+        if area < ROI_MIN_AREA_RATIO * small_area or w * h > ROI_MAX_AREA_RATIO * small_area:
+            # Too little skin to trust, or so much that cropping saves nothing
+            return None
+        
+        # Scale back to full resolution and pad so lesion borders are kept
+        pad_x = int(w * factor * margin)
+        pad_y = int(h * factor * margin)
+        left = max(0, x * factor - pad_x)
+        top = max(0, y * factor - pad_y)
+        right = min(width, (x + w) * factor + pad_x)
+        bottom = min(height, (y + h) * factor + pad_y)
+        
+        return (int(left), int(top), int(right), int(bottom))
+    
+    except Exception as e:
+        st.error(f"Error locating skin region: {str(e)}")
+        return None
+
+def crop_to_skin_roi(image, work_side=ROI_WORK_SIDE, margin=ROI_MARGIN):
+    """Crop the image to the dominant skin region, or return it unchanged"""
+    box = find_skin_roi(image, work_side, margin)
+    if box is None:
+        return image
+    return image.crop(box)
+
 def analyze_image_properties(image):
     """Analyze various properties of the uploaded image"""
     try:
@@ -172,30 +307,104 @@ def analyze_image_properties(image):
         st.error(f"Error analyzing image properties: {str(e)}")
         return {}
 
-def suggest_image_improvements(analysis):
-    """Suggest improvements based on image analysis"""
+def suggest_image_improvements(analysis, min_brightness=50, max_brightness=200, min_contrast=30, min_sharpness=100, min_side=300):
+    """Suggest improvements based on image analysis
+    
+    The default limits are for full-resolution measurements; the quality gate
+    passes its own GATE_WARN_* limits.
+    """
     suggestions = []
     
     if 'brightness' in analysis:
         brightness = analysis['brightness']
-        if brightness < 50:
+        if brightness < min_brightness:
             suggestions.append("Image appears too dark. Try taking the photo in better lighting.")
-        elif brightness > 200:
+        elif brightness > max_brightness:
             suggestions.append("Image appears overexposed. Reduce lighting or camera flash.")
     
     if 'contrast' in analysis:
         contrast = analysis['contrast']
-        if contrast < 30:
+        if contrast < min_contrast:
             suggestions.append("Image has low contrast. Ensure good lighting and focus.")
     
     if 'sharpness' in analysis:
         sharpness = analysis['sharpness']
-        if sharpness < 100:
+        if sharpness < min_sharpness:
             suggestions.append("Image appears blurry. Hold the camera steady and ensure proper focus.")
     
     if 'dimensions' in analysis:
         width, height = map(int, analysis['dimensions'].split(' x '))
-        if width < 300 or height < 300:
+        if width < min_side or height < min_side:
             suggestions.append("Image resolution is low. Try capturing a higher resolution image.")
     
     return suggestions
+
+def get_pyramid_factor(width, height, max_side):
+    """Get the power-of-two reduction factor whose level still covers max_side"""
+    factor = 1
+    while max(width, height) // (factor * 2) >= max_side:
+        factor *= 2
+    return factor
+
+def get_quality_gate_image(image, max_side=QUALITY_GATE_MAX_SIDE):
+    """Get a grayscale pyramid level of the image no larger than max_side"""
+    width, height = image.size
+    factor = get_pyramid_factor(width, height, max_side)
+    
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    
+    # Box reduction happens before the color conversion so only the small copy is converted
+    small = image.reduce(factor) if factor > 1 else image
+    return np.array(small.convert('L'))
+
+def assess_image_quality(image, max_side=QUALITY_GATE_MAX_SIDE):
+    """Estimate blur, exposure and contrast on a downsampled copy before inference"""
+    try:
+        gray = get_quality_gate_image(image, max_side)
+        width, height = image.size
+        
+        brightness = float(np.mean(gray))
+        contrast = float(np.std(gray))
+        sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        
+        analysis = {
+            'dimensions': f"{width} x {height}",
+            'brightness': brightness,
+            'contrast': contrast,
+            'sharpness': sharpness
+        }
+        
+        # Hard failures that make a prediction meaningless
+        issues = []
+        if brightness < GATE_MIN_BRIGHTNESS:
+            issues.append("Image is too dark to analyze. Please retake the photo in better lighting.")
+        elif brightness > GATE_MAX_BRIGHTNESS:
+            issues.append("Image is overexposed. Please retake the photo without direct flash or glare.")
+        if contrast < GATE_MIN_CONTRAST:
+            issues.append("Image has almost no contrast. Please make sure the skin area is in frame and lit.")
+        if sharpness < GATE_MIN_SHARPNESS:
+            issues.append("Image is too blurry to analyze. Hold the camera steady and tap to focus.")
+        
+        # Usable but worth retaking, judged with limits for the gate's scale
+        warnings = []
+        if not issues:
+            warnings = suggest_image_improvements(
+                analysis,
+                min_brightness=GATE_WARN_MIN_BRIGHTNESS,
+                max_brightness=GATE_WARN_MAX_BRIGHTNESS,
+                min_contrast=GATE_WARN_CONTRAST,
+                min_sharpness=GATE_WARN_SHARPNESS,
+                min_side=GATE_WARN_MIN_SIDE
+            )
+        
+        return {
+            'passed': not issues,
+            'issues': issues,
+            'warnings': warnings,
+            'analysis': analysis
+        }
+    
+    except Exception as e:
+        st.error(f"Error checking image quality: {str(e)}")
+        return {'passed': True, 'issues': [], 'warnings': [], 'analysis': {}}
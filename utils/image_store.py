@@ -0,0 +1,149 @@
+import os
+import hashlib
+import threading
+import time
+import numpy as np
+import database
+from database import open_connection
+from model_utils import MODEL_INPUT_SIZE, MODEL_INPUT_CHANNELS
+from utils.archive import list_archives
+
+# Content-addressed store next to the database: <root>/ab/cd/<sha256> holds the
+# original upload, with its thumbnail and model input beside it
+IMAGE_STORE_DIR = "image_store"
+THUMBNAIL_SUFFIX = ".webp"
+MODEL_INPUT_SUFFIX = ".npy"
+
+# History views show these instead of decoding the originals
+THUMBNAIL_SIZE = (256, 256)
+THUMBNAIL_QUALITY = 80
+
+# Blobs younger than this are never garbage collected: the prediction row
+# that references them may still be waiting in the write queue
+GC_GRACE_SECONDS = 3600
+
+def get_image_store_dir():
+    """Get the image store folder for the current database"""
+    return os.path.join(os.path.dirname(database.DATABASE_PATH), IMAGE_STORE_DIR)
+
+def hash_image_bytes(data):
+    """Get the content address of an uploaded file"""
+    return hashlib.sha256(data).hexdigest()
+
+def get_blob_path(sha256, suffix=""):
+    """Get the sharded path of a stored original (or of its derivative with suffix)"""
+    return os.path.join(get_image_store_dir(), sha256[:2], sha256[2:4], f"{sha256}{suffix}")
+
+def get_thumbnail_path(sha256):
+    """Get a stored image's WebP thumbnail, or None if it is not in the store"""
+    path = get_blob_path(sha256, THUMBNAIL_SUFFIX)
+    return path if os.path.exists(path) else None
+
+def write_atomically(path, write):
+    """Write a store file through a temp file so readers never see a partial one"""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def save_thumbnail(image, path):
+    """Write a WebP thumbnail of a PIL image"""
+    thumbnail = image.convert('RGB') if image.mode != 'RGB' else image.copy()
+    thumbnail.thumbnail(THUMBNAIL_SIZE)
+    thumbnail.save(path, format="WEBP", quality=THUMBNAIL_QUALITY)
+
+def save_model_input(model_image, path):
+    """Write the resized model input as a uint8 (224, 224, 3) array"""
+    with open(path, "wb") as array_file:
+        np.save(array_file, np.asarray(model_image, dtype=np.uint8))
+
+def store_image(data, image, model_image, sha256=None):
+    """Store an upload once by content, with its thumbnail and model input
+    
+    image is the decoded upload and model_image the resized model input
+    (see model_utils.resize_for_model). Files already in the store are not
+    rewritten. Returns the content address.
+    """
+    sha256 = sha256 or hash_image_bytes(data)
+    original_path = get_blob_path(sha256)
+    os.makedirs(os.path.dirname(original_path), exist_ok=True)
+    
+    def write_original(path):
+        with open(path, "wb") as original_file:
+            original_file.write(data)
+    
+    for path, write in (
+        (get_blob_path(sha256, THUMBNAIL_SUFFIX), lambda path: save_thumbnail(image, path)),
+        (get_blob_path(sha256, MODEL_INPUT_SUFFIX), lambda path: save_model_input(model_image, path)),
+        # The original goes last, so its presence means the derivatives exist too
+        (original_path, write_original)
+    ):
+        if os.path.exists(path):
+            # Marks the blob as in use again for collect_garbage's grace period
+            os.utime(path)
+        else:
+            write_atomically(path, write)
+    
+    return sha256
+
+def load_model_input(sha256, out=None):
+    """Load a stored image as a normalized (1, 224, 224, 3) float32 model input without decoding it
+    
+    Like model_utils.preprocess_image, writes into out when given. Returns
+    None if the image is not in the store.
+    """
+    path = get_blob_path(sha256, MODEL_INPUT_SUFFIX)
+    if not os.path.exists(path):
+        return None
+    
+    pixels = np.load(path)
+    if pixels.shape != (*MODEL_INPUT_SIZE, MODEL_INPUT_CHANNELS):
+        return None
+    
+    if out is None:
+        out = np.empty(pixels.shape, dtype=np.float32)
+    np.multiply(pixels, np.float32(1.0 / 255.0), out=out)
+    return out[np.newaxis]
+
+def get_referenced_images():
+    """Get every image hash referenced by a prediction, in the hot database or an archive"""
+    referenced = set()
+    
+    for path in [None] + list_archives():
+        conn = open_connection(path)
+        try:
+            # Archives created before image references existed have no such column
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(predictions)").fetchall()]
+            if "image_sha256" in columns:
+                referenced.update(row[0] for row in conn.execute(
+                    "SELECT DISTINCT image_sha256 FROM predictions WHERE image_sha256 IS NOT NULL"
+                ))
+        finally:
+            conn.close_connection()
+    
+    return referenced
+
+def collect_garbage(grace_seconds=GC_GRACE_SECONDS):
+    """Delete stored images no prediction references any more; returns (images removed, bytes freed)"""
+    referenced = get_referenced_images()
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    freed = 0
+    
+    for directory, _, names in os.walk(get_image_store_dir()):
+        for name in names:
+            sha256 = name.split(".")[0]
+            path = os.path.join(directory, name)
+            if sha256 in referenced or os.path.getmtime(path) > cutoff:
+                continue
+            
+            freed += os.path.getsize(path)
+            os.remove(path)
+            if name == sha256:
+                removed += 1
+    
+    return removed, freed
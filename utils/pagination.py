@@ -0,0 +1,75 @@
+import streamlit as st
+from database import get_db_connection
+
+# Page size choices for the admin tables
+PAGE_SIZES = [25, 50, 100]
+
+def build_where_clause(filters):
+    """Join filter conditions into a WHERE clause"""
+    if not filters:
+        return ""
+    return "WHERE " + " AND ".join(f"({condition})" for condition in filters)
+
+def count_rows(from_sql, filters=None, params=(), conn=None):
+    """Count the rows matching the filters"""
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) {from_sql} {build_where_clause(filters)}", tuple(params))
+    total = cursor.fetchone()[0]
+    
+    if own_conn:
+        conn.close()
+    
+    return total
+
+def fetch_page(columns, from_sql, filters=None, params=(), order_by="1", page=1, page_size=PAGE_SIZES[0], conn=None):
+    """Fetch one page of rows with filtering, sorting and paging done in SQL
+    
+    order_by must come from a fixed list of choices, never from user input.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {columns}
+        {from_sql}
+        {build_where_clause(filters)}
+        ORDER BY {order_by}
+        LIMIT ? OFFSET ?
+    ''', (*params, page_size, (page - 1) * page_size))
+    rows = cursor.fetchall()
+    
+    if own_conn:
+        conn.close()
+    
+    return rows
+
+def show_pagination_controls(key, total_count, page_sizes=PAGE_SIZES):
+    """Show page size and page number pickers, returning (page, page_size)"""
+    col1, col2, col3 = st.columns([1, 1, 2])
+    
+    with col1:
+        page_size = st.selectbox("Rows per page:", page_sizes, key=f"{key}_page_size")
+    
+    total_pages = max(1, -(-total_count // page_size))
+    
+    # Filters may have shrunk the result since the page was picked
+    page_key = f"{key}_page"
+    if st.session_state.get(page_key, 1) > total_pages:
+        st.session_state[page_key] = total_pages
+    
+    with col2:
+        page = st.number_input("Page:", min_value=1, max_value=total_pages, step=1, key=page_key)
+    
+    with col3:
+        first = min(total_count, (page - 1) * page_size + 1)
+        last = min(total_count, page * page_size)
+        st.write("")
+        st.write(f"Showing {first}-{last} of {total_count} (page {page} of {total_pages})")
+    
+    return int(page), page_size
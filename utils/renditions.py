@@ -0,0 +1,74 @@
+import io
+import threading
+from collections import OrderedDict
+from utils.image_processing import resize_image_for_display
+
+# Default display size; matches resize_image_for_display
+DISPLAY_MAX_WIDTH = 800
+DISPLAY_MAX_HEIGHT = 600
+
+# Streamlit passes JPEG bytes through to the browser as they are; other
+# formats (WebP included) are decoded and re-encoded on every call
+RENDITION_FORMAT = "JPEG"
+RENDITION_QUALITY = 85
+
+# Total encoded bytes kept, shared by every session; least recently used go first
+RENDITION_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# (image key, max width, max height) -> encoded bytes, oldest use first
+_renditions = OrderedDict()
+_rendition_bytes = 0
+_rendition_lock = threading.Lock()
+_rendition_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+def encode_rendition(image):
+    """Encode a display-sized PIL image for the browser"""
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    
+    output = io.BytesIO()
+    image.save(output, format=RENDITION_FORMAT, quality=RENDITION_QUALITY, optimize=True)
+    return output.getvalue()
+
+def get_display_rendition(image_key, load_image, max_width=DISPLAY_MAX_WIDTH, max_height=DISPLAY_MAX_HEIGHT):
+    """Get encoded bytes of an image scaled to fit max_width x max_height
+    
+    image_key identifies the image content (its SHA-256). load_image() returns
+    the PIL image and is only called on a miss, so a hit never decodes or
+    resizes anything.
+    """
+    global _rendition_bytes
+    
+    cache_key = (image_key, max_width, max_height)
+    with _rendition_lock:
+        data = _renditions.get(cache_key)
+        if data is not None:
+            _renditions.move_to_end(cache_key)
+            _rendition_stats['hits'] += 1
+            return data
+        _rendition_stats['misses'] += 1
+    
+    data = encode_rendition(resize_image_for_display(load_image(), max_width, max_height))
+    
+    with _rendition_lock:
+        if cache_key not in _renditions:
+            _renditions[cache_key] = data
+            _rendition_bytes += len(data)
+        
+        while _rendition_bytes > RENDITION_CACHE_MAX_BYTES and len(_renditions) > 1:
+            _, evicted = _renditions.popitem(last=False)
+            _rendition_bytes -= len(evicted)
+            _rendition_stats['evictions'] += 1
+    
+    return data
+
+def get_rendition_stats():
+    """Get hit/miss/eviction counters with the cache's entry count and size"""
+    with _rendition_lock:
+        lookups = _rendition_stats['hits'] + _rendition_stats['misses']
+        return {
+            **_rendition_stats,
+            'entries': len(_renditions),
+            'bytes': _rendition_bytes,
+            'hit_rate': _rendition_stats['hits'] / lookups if lookups else 0.0
+        }
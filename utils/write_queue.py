@@ -0,0 +1,133 @@
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from database import get_db_connection
+
+# A batch is committed once it holds this many writes or the oldest has waited this long.
+# With no wait, a batch is whatever queued up while the previous one was committing.
+WRITE_BATCH_SIZE = 256
+WRITE_BATCH_WAIT = 0
+SHUTDOWN_FLUSH_TIMEOUT = 10
+
+# One writer thread per process owns all queued inserts
+_write_queue = queue.Queue()
+_writer_thread = None
+_writer_lock = threading.Lock()
+_write_stats = {'writes': 0, 'failed': 0, 'batches': 0}
+
+def start_writer():
+    """Start the background writer thread if it is not running"""
+    global _writer_thread
+    
+    with _writer_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(target=run_writer, name="db-writer", daemon=True)
+            _writer_thread.start()
+
+def submit_write(operation, *args):
+    """Queue operation(cursor, *args) for the writer thread
+    
+    Returns a Future that resolves with the operation's result only after
+    the batch containing it has committed, or with its exception.
+    """
+    future = Future()
+    start_writer()
+    _write_queue.put((operation, args, future))
+    return future
+
+def execute_write(operation, *args, timeout=None):
+    """Queue a write and wait for its commit, returning the operation's result"""
+    return submit_write(operation, *args).result(timeout)
+
+def flush_marker(cursor):
+    """No-op write used as a barrier by flush_writes"""
+    return None
+
+def flush_writes(timeout=None):
+    """Wait until every write queued so far has been committed"""
+    # The queue is FIFO with a single consumer, so a no-op write acts as a barrier
+    submit_write(flush_marker).result(timeout)
+
+def collect_batch(first):
+    """Gather queued writes behind first until the batch is full or its wait runs out"""
+    batch = [first]
+    deadline = time.monotonic() + WRITE_BATCH_WAIT
+    
+    while len(batch) < WRITE_BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        try:
+            batch.append(_write_queue.get(timeout=remaining) if remaining > 0 else _write_queue.get_nowait())
+        except queue.Empty:
+            break
+    
+    return batch
+
+def write_batch(batch):
+    """Apply a batch in one transaction, isolating each write in a savepoint"""
+    if all(operation is flush_marker for operation, _, _ in batch):
+        for _, _, future in batch:
+            future.set_result(None)
+        return
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    outcomes = []
+    
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for operation, args, future in batch:
+            # A failing write is rolled back on its own without losing the rest of the batch
+            cursor.execute("SAVEPOINT queued_write")
+            try:
+                outcomes.append((future, operation(cursor, *args), None))
+            except Exception as e:
+                cursor.execute("ROLLBACK TO queued_write")
+                outcomes.append((future, None, e))
+            cursor.execute("RELEASE queued_write")
+        conn.commit()
+    except Exception as e:
+        conn.close()
+        _write_stats['failed'] += len(batch)
+        for _, _, future in batch:
+            future.set_exception(e)
+        return
+    
+    conn.close()
+    _write_stats['batches'] += 1
+    
+    # Results are handed back only now that they are committed
+    for future, result, error in outcomes:
+        if error is None:
+            _write_stats['writes'] += 1
+            future.set_result(result)
+        else:
+            _write_stats['failed'] += 1
+            future.set_exception(error)
+
+def run_writer():
+    """Drain the write queue forever, committing in groups"""
+    while True:
+        batch = collect_batch(_write_queue.get())
+        try:
+            write_batch(batch)
+        except Exception as e:
+            print(f"Write queue error: {e}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+def get_write_stats():
+    """Get counts of committed writes, failed writes and batches"""
+    return {**_write_stats, 'queued': _write_queue.qsize()}
+
+def shutdown_writer():
+    """Commit anything still queued before the interpreter exits"""
+    if _writer_thread is not None and _writer_thread.is_alive():
+        try:
+            flush_writes(SHUTDOWN_FLUSH_TIMEOUT)
+        except Exception as e:
+            print(f"Could not flush queued writes: {e}")
+
+atexit.register(shutdown_writer)